@@ -0,0 +1,73 @@
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+
+from app.api.dependencies import get_current_admin_user
+from app.core import profiler
+from app.core.orders import sales_by_day, sales_by_product, sales_by_size
+from app.db.database import get_db
+
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["admin"],
+    dependencies=[Depends(get_current_admin_user)],
+)
+
+
+def _date_range(start: Optional[date], end: Optional[date]) -> tuple[date, date]:
+    # Orders are bucketed by UTC day
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must not be after end",
+        )
+    return start, end
+
+
+@router.get("/sales/daily")
+def get_sales_by_day(
+    start: Optional[date] = None, end: Optional[date] = None, db: Session = Depends(get_db)
+):
+    """Units and revenue per day (defaults to the last 30 days)"""
+    start, end = _date_range(start, end)
+    return {"start": start, "end": end, "days": sales_by_day(db, start, end)}
+
+
+@router.get("/sales/products")
+def get_sales_by_product(
+    start: Optional[date] = None, end: Optional[date] = None, db: Session = Depends(get_db)
+):
+    """Units and revenue per product, best sellers first"""
+    start, end = _date_range(start, end)
+    return {"start": start, "end": end, "products": sales_by_product(db, start, end)}
+
+
+@router.get("/sales/sizes")
+def get_sales_by_size(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    product_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Units and revenue per product and size"""
+    start, end = _date_range(start, end)
+    return {"start": start, "end": end, "sizes": sales_by_size(db, start, end, product_id)}
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    seconds: float = Query(10, gt=0, le=profiler.MAX_SECONDS),
+    interval_ms: float = Query(5, ge=1, le=100),
+):
+    """Sample this worker's stacks; returns collapsed stacks for flamegraphs"""
+    try:
+        # Sample from a thread so the event loop keeps serving the traffic being profiled
+        return await asyncio.to_thread(profiler.sample, seconds, interval_ms / 1000)
+    except profiler.ProfilerBusyError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
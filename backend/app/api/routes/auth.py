@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
@@ -16,6 +16,8 @@ from app.core.security import (
 )
 from app.core.config import settings
 from app.api.dependencies import get_current_user
+from app.core.metrics import upstream_call
+from app.core.rate_limit import enforce_login, enforce_register
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
@@ -48,8 +50,10 @@ class UserResponse(BaseModel):
 
 
 @router.post("/register", response_model=dict)
-def register(user_data: UserRegister, db: Session = Depends(get_db)):
+def register(user_data: UserRegister, request: Request, db: Session = Depends(get_db)):
     """Register a new user"""
+    enforce_register(request)
+
     # Check if user already exists
     existing_user = db.query(User).filter(
         (User.email == user_data.email) | (User.username == user_data.email)
@@ -94,8 +98,10 @@ def register(user_data: UserRegister, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=dict)
-def login(user_data: UserLogin, db: Session = Depends(get_db)):
+def login(user_data: UserLogin, request: Request, db: Session = Depends(get_db)):
     """Login with email and password"""
+    enforce_login(request, user_data.email)
+
     # Find user by email
     user = db.query(User).filter(User.email == user_data.email).first()
     
@@ -132,10 +138,13 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
 
 @router.post("/token", response_model=Token)
 def login_for_access_token(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
     """OAuth2 compatible token login (for API docs)"""
+    enforce_login(request, form_data.username)
+
     user = db.query(User).filter(User.email == form_data.username).first()
     
     if not user or not verify_password(form_data.password, user.hashed_password):
@@ -206,16 +215,17 @@ async def google_callback(code: str, db: Session = Depends(get_db)):
     
     # Exchange code for tokens
     async with httpx.AsyncClient() as client:
-        token_response = await client.post(
-            "https://oauth2.googleapis.com/token",
-            data={
-                "code": code,
-                "client_id": settings.GOOGLE_CLIENT_ID,
-                "client_secret": settings.GOOGLE_CLIENT_SECRET,
-                "redirect_uri": settings.GOOGLE_REDIRECT_URI,
-                "grant_type": "authorization_code",
-            }
-        )
+        with upstream_call("google", "oauth2.token"):
+            token_response = await client.post(
+                settings.GOOGLE_TOKEN_URL,
+                data={
+                    "code": code,
+                    "client_id": settings.GOOGLE_CLIENT_ID,
+                    "client_secret": settings.GOOGLE_CLIENT_SECRET,
+                    "redirect_uri": settings.GOOGLE_REDIRECT_URI,
+                    "grant_type": "authorization_code",
+                }
+            )
         
         if token_response.status_code != 200:
             raise HTTPException(
@@ -227,10 +237,11 @@ async def google_callback(code: str, db: Session = Depends(get_db)):
         access_token = tokens.get("access_token")
         
         # Get user info from Google
-        user_info_response = await client.get(
-            "https://www.googleapis.com/oauth2/v2/userinfo",
-            headers={"Authorization": f"Bearer {access_token}"}
-        )
+        with upstream_call("google", "oauth2.userinfo"):
+            user_info_response = await client.get(
+                settings.GOOGLE_USERINFO_URL,
+                headers={"Authorization": f"Bearer {access_token}"}
+            )
         
         if user_info_response.status_code != 200:
             raise HTTPException(
@@ -1,15 +1,38 @@
+import time
+import uuid
+from datetime import timedelta
 from typing import Any, Optional
 
 import stripe
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
 from pydantic import BaseModel
-
-from app.core.config import settings
+from sqlalchemy.orm import Session
+
+from app.core.cache import shared_backend
+from app.core.cart import InvalidCartError, ResolvedCart, ResolvedItem, resolve_cart
+from app.core.catalog import CatalogUnavailableError, get_catalog_index
+from app.core.config import CHECKOUT_EXPIRY_MARGIN_SECONDS, settings
+from app.core.idempotency import IdempotentCalls, idempotency_key
+from app.core.metrics import upstream_call
+from app.core.reservations import (
+    OutOfStockError,
+    StockKey,
+    attach_session,
+    release_hold,
+    reserve,
+)
+from app.db.database import get_db
 
 router = APIRouter(prefix="/api/checkout", tags=["checkout"])
 
+checkout_calls = IdempotentCalls(
+    shared_backend, "balm:checkout", ttl=settings.CHECKOUT_IDEMPOTENCY_SECONDS
+)
+
 
 class CheckoutItem(BaseModel):
+    # Only the product/price ID, size and quantity are used; prices, titles
+    # and images come from the catalog. The rest is accepted for older clients.
     price: Optional[str] = None
     price_data: Optional[dict[str, Any]] = None
     quantity: Optional[int] = 1
@@ -29,44 +52,104 @@ class CheckoutSessionRequest(BaseModel):
     cancelUrl: str
 
 
-def _build_line_item(item: CheckoutItem) -> dict[str, Any]:
-    quantity = item.quantity or 1
-
-    if item.price and isinstance(item.price, str) and item.price.startswith("price_"):
-        return {"price": item.price, "quantity": quantity}
+def _build_line_item(item: ResolvedItem) -> dict[str, Any]:
+    return {"price": item.entry.price_id, "quantity": item.quantity}
 
-    if item.price_data:
-        return {"price_data": item.price_data, "quantity": quantity}
-
-    raw_amount = item.unit_amount if item.unit_amount is not None else 0
-    return {
-        "price_data": {
-            "currency": "usd",
-            "product_data": {
-                "name": item.title or item.name,
-                "description": item.description,
-                "images": [item.image] if item.image else [],
-            },
-            "unit_amount": round(raw_amount * 100),
-        },
-        "quantity": quantity,
-    }
 
-
-def _build_metadata(items: list[CheckoutItem]) -> dict[str, str]:
+def _build_metadata(items: list[ResolvedItem]) -> dict[str, str]:
     metadata: dict[str, str] = {}
     for index, item in enumerate(items):
         if item.size:
             metadata[f"item_{index}_size"] = item.size
-            metadata[f"item_{index}_product_id"] = (
-                item.stripeProductId or item.productId or ""
-            )
-            metadata[f"item_{index}_quantity"] = str(item.quantity or 1)
+            metadata[f"item_{index}_product_id"] = item.entry.product_id
+            metadata[f"item_{index}_quantity"] = str(item.quantity)
     return metadata
 
 
+def _out_of_stock(unavailable: list[StockKey]) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail={
+            "message": "Some items are out of stock",
+            "unavailable": [
+                {"productId": product_id, "size": size}
+                for product_id, size in unavailable
+            ],
+        },
+    )
+
+
+def _session_expiry(now: int) -> int:
+    """Stripe expiry for a session opened at ``now``.
+
+    Fixed per idempotency window, so every worker retrying the same cart within
+    a window sends Stripe identical parameters under the same key. The margin
+    keeps sessions opened at the end of a window above Stripe's minimum.
+    """
+    window = settings.CHECKOUT_IDEMPOTENCY_SECONDS
+    return (
+        (now // window + 1) * window
+        + settings.CHECKOUT_HOLD_MINUTES * 60
+        + CHECKOUT_EXPIRY_MARGIN_SECONDS
+    )
+
+
+def _open_session(
+    payload: CheckoutSessionRequest,
+    cart: ResolvedCart,
+    line_items: list[dict[str, Any]],
+    metadata: dict[str, str],
+    db: Session,
+    stripe_idempotency_key: Optional[str],
+    now: int,
+) -> str:
+    hold_id = f"hold_{uuid.uuid4().hex}"
+    expires_at = _session_expiry(now)
+    try:
+        # Hold one minute past the Stripe expiry so the session never outlives its stock
+        reserve(db, hold_id, cart.requested, cart.stock, timedelta(seconds=expires_at - now + 60))
+    except OutOfStockError as e:
+        raise _out_of_stock(e.unavailable)
+
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    stripe.api_base = settings.STRIPE_API_BASE
+
+    try:
+        with upstream_call("stripe", "checkout.Session.create"):
+            session = stripe.checkout.Session.create(
+                payment_method_types=["card"],
+                line_items=line_items,
+                mode="payment",
+                success_url=payload.successUrl,
+                cancel_url=payload.cancelUrl,
+                shipping_address_collection={"allowed_countries": ["US", "CA"]},
+                billing_address_collection="required",
+                metadata=metadata,
+                expires_at=expires_at,
+                idempotency_key=stripe_idempotency_key,
+            )
+    except stripe.error.IdempotencyError:
+        release_hold(db, hold_id)
+        raise
+    except stripe.error.StripeError as e:
+        release_hold(db, hold_id)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e.user_message or e),
+        )
+
+    # A replayed key returns a session another worker already holds stock for
+    attach_session(db, hold_id, session.id)
+    return session.url
+
+
 @router.post("/session")
-def create_checkout_session(payload: CheckoutSessionRequest):
+def create_checkout_session(
+    payload: CheckoutSessionRequest,
+    db: Session = Depends(get_db),
+    client_session: Optional[str] = Header(None, alias="X-Client-Session"),
+    authorization: Optional[str] = Header(None),
+):
     if not settings.STRIPE_SECRET_KEY:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -79,23 +162,46 @@ def create_checkout_session(payload: CheckoutSessionRequest):
             detail="Invalid items",
         )
 
-    stripe.api_key = settings.STRIPE_SECRET_KEY
-
     try:
-        session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=[_build_line_item(i) for i in payload.items],
-            mode="payment",
-            success_url=payload.successUrl,
-            cancel_url=payload.cancelUrl,
-            shipping_address_collection={"allowed_countries": ["US", "CA"]},
-            billing_address_collection="required",
-            metadata=_build_metadata(payload.items),
-        )
-    except stripe.error.StripeError as e:
+        cart = resolve_cart(payload.items, get_catalog_index())
+    except CatalogUnavailableError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except InvalidCartError as e:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e.user_message or e),
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"message": "Invalid items", "problems": e.problems},
         )
-
-    return {"url": session.url}
+    # Cheap rejection before any hold or Stripe call; reserve() re-checks atomically
+    if cart.unavailable:
+        raise _out_of_stock(cart.unavailable)
+
+    line_items = [_build_line_item(i) for i in cart.items]
+    metadata = _build_metadata(cart.items)
+
+    # Without something identifying the shopper, identical carts from two
+    # people must not share a session, so only identified requests collapse.
+    client = client_session or authorization
+    if not client:
+        url = _open_session(payload, cart, line_items, metadata, db, None, int(time.time()))
+        return {"url": url}
+
+    key = idempotency_key(
+        line_items, metadata, payload.successUrl, payload.cancelUrl, client
+    )
+    # The key rolls over with each window; the session expiry is derived from
+    # the same reading, so the two can't straddle a window boundary
+    now = int(time.time())
+    stripe_key = f"checkout-{key}-{now // settings.CHECKOUT_IDEMPOTENCY_SECONDS}"
+    try:
+        url = checkout_calls.run(
+            key, lambda: _open_session(payload, cart, line_items, metadata, db, stripe_key, now)
+        )
+    except stripe.error.IdempotencyError:
+        # Another worker opened this session under the same key; hand out its URL
+        url = checkout_calls.stored(key)
+        if url is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="This checkout is already being opened. Please try again.",
+            )
+    return {"url": url}
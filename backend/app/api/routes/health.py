@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Response
+
+from app.core.catalog import is_ready
+
+router = APIRouter(prefix="/api/health", tags=["health"])
+
+
+@router.get("")
+def liveness():
+    """The process is up and serving requests"""
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+def readiness(response: Response):
+    """Ready once the catalog is warm; load balancers should wait for this"""
+    if not is_ready():
+        response.status_code = 503
+        return {"status": "warming"}
+    return {"status": "ready"}
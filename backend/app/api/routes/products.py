@@ -1,95 +1,101 @@
-from typing import Any
+import json
+import threading
+from typing import Any, Optional
 
-import stripe
-from fastapi import APIRouter, Response
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, EmailStr
+from sqlalchemy.orm import Session
 
+from app.core.catalog import CatalogUnavailableError, get_catalog, get_catalog_index
+from app.core.compression import CompressedPayload
 from app.core.config import settings
+from app.core.rate_limit import enforce_restock
+from app.core.restock import subscribe
+from app.core.stock_stream import broadcaster
+from app.db.database import get_db
 
 router = APIRouter(prefix="/api/products", tags=["products"])
 
+# (products list the payload was rendered from, payload)
+_payload: Optional[tuple[list[dict[str, Any]], CompressedPayload]] = None
+_payload_lock = threading.Lock()
 
-LOCAL_PRODUCT_IMAGES: dict[str, dict[str, Any]] = {
-    "prod_URjiesOVeb9YC9": {
-        "images": [
-            "/img/products/balm-cursive.png",
-        ],
-        "sizeChart": {
-            "sizes": ["S", "M", "L", "XL", "2XL", "3XL"],
-            "measurements": {
-                "S": {"bodyLength": "27 1/2", "chestWidth": "21 1/2", "sleeveLength": "34"},
-                "M": {"bodyLength": "28 1/2", "chestWidth": "23", "sleeveLength": "35"},
-                "L": {"bodyLength": "29 1/2", "chestWidth": "24 1/2", "sleeveLength": "36"},
-                "XL": {"bodyLength": "30 1/2", "chestWidth": "26", "sleeveLength": "37"},
-                "2XL": {"bodyLength": "31", "chestWidth": "27 1/2", "sleeveLength": "38"},
-                "3XL": {"bodyLength": "31 1/2", "chestWidth": "29", "sleeveLength": "38 3/4"},
-            },
-        },
-    }
-}
-
-
-def _format_product(product: Any) -> dict[str, Any]:
-    metadata = product.get("metadata") or {}
-    price = product.get("default_price")
-    price_amount = (price.get("unit_amount") / 100) if price and price.get("unit_amount") is not None else 0
-
-    sizes_raw = metadata.get("sizes", "")
-    sizes = [s.strip() for s in sizes_raw.split(",")] if sizes_raw else []
-
-    inventory: dict[str, int] = {}
-    for size in sizes:
-        stock_key = f"stock_{size}"
-        if metadata.get(stock_key) is not None:
-            try:
-                inventory[size] = int(metadata[stock_key])
-            except (TypeError, ValueError):
-                inventory[size] = 0
-
-    local_data = LOCAL_PRODUCT_IMAGES.get(product["id"], {})
-    local_images = local_data.get("images") or []
-    stripe_images = product.get("images") or []
-    # Prefer local override so we control the canonical product imagery; fall back to Stripe.
-    product_images = local_images if local_images else stripe_images
-    main_image = product_images[0] if product_images else "/img/products/placeholder-product.svg"
-
-    colors_raw = metadata.get("colors", "")
-
-    return {
-        "id": product["id"],
-        "stripeProductId": product["id"],
-        "stripePriceId": price.get("id") if price else None,
-        "title": product.get("name"),
-        "price": price_amount,
-        "description": product.get("description") or "",
-        "image": main_image,
-        "images": product_images,
-        "mainCategory": metadata.get("category", "art"),
-        "sizes": sizes,
-        "colors": [c.strip() for c in colors_raw.split(",")] if colors_raw else [],
-        "details": metadata.get("details", ""),
-        "inventory": inventory if inventory else None,
-        "sizeChart": local_data.get("sizeChart"),
-        "metadata": metadata,
-    }
+
+def _catalog_payload(products: list[dict[str, Any]]) -> CompressedPayload:
+    """Serialized catalog, rebuilt only when the catalog changes"""
+    global _payload
+    payload = _payload
+    if payload is None or payload[0] is not products:
+        with _payload_lock:
+            payload = _payload
+            if payload is None or payload[0] is not products:
+                body = json.dumps(
+                    {"products": products}, ensure_ascii=False, separators=(",", ":")
+                ).encode()
+                payload = _payload = (products, CompressedPayload(body))
+    return payload[1]
 
 
 @router.get("")
-def list_products(response: Response):
+def list_products(request: Request, response: Response):
     if not settings.STRIPE_SECRET_KEY:
         response.status_code = 503
         return {"error": "Stripe is not configured", "products": []}
 
-    stripe.api_key = settings.STRIPE_SECRET_KEY
-
     try:
-        products = stripe.Product.list(
-            active=True,
-            expand=["data.default_price"],
-            limit=100,
-        )
-    except stripe.error.StripeError as e:
-        response.status_code = 500
-        return {"error": str(e.user_message or e), "products": []}
-
-    response.headers["Cache-Control"] = "public, max-age=300"
-    return {"products": [_format_product(p) for p in products.data]}
+        catalog = get_catalog()
+    except CatalogUnavailableError as e:
+        response.status_code = e.status_code
+        return {"error": str(e), "products": []}
+
+    headers = {"Cache-Control": "public, max-age=300"}
+    if catalog.stale_seconds is not None:
+        # Served from the last-known-good snapshot while Stripe is unavailable
+        headers["X-Catalog-Stale-Seconds"] = str(int(catalog.stale_seconds))
+        headers["Cache-Control"] = "public, max-age=30"
+    # Serialized and compressed once per catalog version, not per request
+    return _catalog_payload(catalog.products).response(request, headers)
+
+
+@router.get("/stream")
+async def stream_stock(last_event_id: Optional[str] = Header(None)):
+    """Server-sent stock changes (``event: stock``) as sizes sell or are restocked"""
+    if broadcaster.closed:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Shutting down")
+    return StreamingResponse(
+        broadcaster.stream(last_event_id),
+        media_type="text/event-stream",
+        # Proxies must pass each event through rather than buffer the response
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+class RestockSubscribeRequest(BaseModel):
+    email: EmailStr
+    # Omitted (or empty) for products without sizes
+    size: Optional[str] = None
+
+
+@router.post("/{product_id}/notify")
+def subscribe_restock(
+    product_id: str,
+    payload: RestockSubscribeRequest,
+    request: Request,
+    db: Session = Depends(get_db),
+):
+    """Email the shopper when this size is back in stock"""
+    enforce_restock(request, payload.email)
+    try:
+        entry = get_catalog_index().by_product.get(product_id)
+    except CatalogUnavailableError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    if entry is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    size = payload.size or ""
+    valid = size in entry.sizes if entry.sizes else size == ""
+    if not valid:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid size")
+
+    subscribe(db, product_id, size, payload.email)
+    return {"subscribed": True}
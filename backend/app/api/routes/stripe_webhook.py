@@ -1,22 +1,28 @@
+import asyncio
 import logging
-import re
 from typing import Any
 
 import stripe
-from fastapi import APIRouter, HTTPException, Header, Request, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Header, Request, status
+from sqlalchemy.orm import Session
 
+from app.core.cache import catalog_cache
 from app.core.config import settings
+from app.core.metrics import upstream_call
+from app.core.orders import claim_stock_item, record_order, release_stock_item, unapplied_stock_items
+from app.core.reservations import release_session
+from app.core.restock import notify_restock, restocked_sizes, stock_changes
+from app.core.stock_stream import broadcaster
+from app.db.database import get_db
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/stripe", tags=["stripe"])
 
 
-_ITEM_KEY_RE = re.compile(r"^item_(\d+)_(.+)$")
-
-
 def _decrement_inventory(product_id: str, size: str, quantity: int) -> int:
-    product = stripe.Product.retrieve(product_id)
+    with upstream_call("stripe", "Product.retrieve"):
+        product = stripe.Product.retrieve(product_id)
     metadata = dict(product.get("metadata") or {})
     stock_key = f"stock_{size}"
 
@@ -27,7 +33,9 @@ def _decrement_inventory(product_id: str, size: str, quantity: int) -> int:
 
     new_stock = max(0, current_stock - quantity)
     metadata[stock_key] = str(new_stock)
-    stripe.Product.modify(product_id, metadata=metadata)
+    with upstream_call("stripe", "Product.modify"):
+        stripe.Product.modify(product_id, metadata=metadata)
+    # Streamed when Stripe sends the resulting product.updated
 
     if new_stock == 0:
         logger.warning("OUT OF STOCK: %s - Size %s", product.get("name"), size)
@@ -39,37 +47,68 @@ def _decrement_inventory(product_id: str, size: str, quantity: int) -> int:
     return new_stock
 
 
-def _handle_checkout_completed(session: Any) -> None:
-    metadata = session.get("metadata") or {}
-    items: dict[int, dict[str, str]] = {}
-
-    for key, value in metadata.items():
-        m = _ITEM_KEY_RE.match(key)
-        if not m:
-            continue
-        index = int(m.group(1))
-        field = m.group(2)
-        items.setdefault(index, {})[field] = value
-
-    if not items:
+def _handle_checkout_completed(session: Any, completed_at: int, db: Session) -> None:
+    if record_order(db, session, completed_at) is None:
+        # Redelivered: only lines whose decrement failed last time remain
+        logger.info("Checkout session %s already recorded", session.get("id"))
+    elif not unapplied_stock_items(db, session["id"]):
         logger.warning(
             "No size information found in checkout metadata for session %s", session.get("id")
         )
         return
 
-    for item in items.values():
-        if not item.get("size") or not item.get("product_id") or not item.get("quantity"):
-            logger.warning("Incomplete item data in metadata, skipping: %s", item)
-            continue
+    for item in unapplied_stock_items(db, session["id"]):
+        if not claim_stock_item(db, item.id):
+            continue  # A concurrent delivery is applying this line
         try:
-            quantity = int(item["quantity"])
-        except (TypeError, ValueError):
-            continue
-        _decrement_inventory(item["product_id"], item["size"], quantity)
+            _decrement_inventory(item.product_id, item.size, item.quantity)
+        except Exception:
+            release_stock_item(db, item.id)
+            raise
+
+
+def _handle_product_updated(event: Any, background_tasks: BackgroundTasks) -> None:
+    product = event["data"]["object"]
+    previous = (event["data"].get("previous_attributes") or {}).get("metadata")
+    if not previous:
+        return
+    # Every stock edit lands here: sales, restocks, reconcile --apply and the dashboard
+    for size, stock, delta in stock_changes(product.get("metadata") or {}, previous):
+        broadcaster.publish(product["id"], size, stock, delta)
+    for size in restocked_sizes(product.get("metadata") or {}, previous):
+        logger.info("BACK IN STOCK: %s - Size %s", product.get("name"), size)
+        # Fan-out runs after the response so Stripe isn't kept waiting
+        background_tasks.add_task(notify_restock, product["id"], product.get("name"), size)
+
+
+def _handle_event(event: Any, db: Session, background_tasks: BackgroundTasks) -> None:
+    event_type = event["type"]
+    if event_type == "checkout.session.completed":
+        session = event["data"]["object"]
+        _handle_checkout_completed(session, event["created"], db)
+        # Stripe stock now reflects the sale, so the hold can go
+        catalog_cache.invalidate(event_type)
+        release_session(db, session["id"])
+    elif event_type == "checkout.session.expired":
+        release_session(db, event["data"]["object"]["id"])
+    elif event_type.startswith(("product.", "price.")):
+        # Catalog edited in the Stripe dashboard
+        catalog_cache.invalidate(event_type)
+        if event_type == "product.updated":
+            _handle_product_updated(event, background_tasks)
+    elif event_type == "payment_intent.succeeded":
+        logger.info("Payment succeeded: %s", event["data"]["object"]["id"])
+    else:
+        logger.info("Unhandled event type: %s", event_type)
 
 
 @router.post("/webhook")
-async def stripe_webhook(request: Request, stripe_signature: str = Header(None)):
+async def stripe_webhook(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    stripe_signature: str = Header(None),
+    db: Session = Depends(get_db),
+):
     if not settings.STRIPE_SECRET_KEY or not settings.STRIPE_WEBHOOK_SECRET:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -77,6 +116,7 @@ async def stripe_webhook(request: Request, stripe_signature: str = Header(None))
         )
 
     stripe.api_key = settings.STRIPE_SECRET_KEY
+    stripe.api_base = settings.STRIPE_API_BASE
 
     payload = await request.body()
     try:
@@ -89,12 +129,7 @@ async def stripe_webhook(request: Request, stripe_signature: str = Header(None))
             detail=f"Webhook Error: {e}",
         )
 
-    event_type = event["type"]
-    if event_type == "checkout.session.completed":
-        _handle_checkout_completed(event["data"]["object"])
-    elif event_type == "payment_intent.succeeded":
-        logger.info("Payment succeeded: %s", event["data"]["object"]["id"])
-    else:
-        logger.info("Unhandled event type: %s", event_type)
-
+    # Stripe calls and DB writes block, so keep them off the event loop
+    # serving the stock streams
+    await asyncio.to_thread(_handle_event, event, db, background_tasks)
     return {"received": True}
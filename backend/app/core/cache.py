@@ -0,0 +1,446 @@
+"""Shared catalog cache used by every worker and replica.
+
+The backend is chosen from ``settings.CACHE_URL``:
+
+- ``memory://`` keeps everything in the current process (dev, tests).
+- ``sqlite:///path/to/cache.db`` shares entries between workers on one host.
+  Point it at ``/dev/shm`` to keep the file in shared memory. Published
+  messages go through a table that every worker polls.
+- ``redis://host:6379/0`` shares entries across hosts (needs the ``redis``
+  package).
+
+Cached products are stamped with a version number. Workers compare that stamp
+with the current version key, which is a single small read, and they only
+deserialize the catalog when the stamp has moved.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Optional, Protocol
+
+from app.core.config import settings
+from app.core.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> Optional[str]: ...
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None) -> None: ...
+
+    def incr(self, key: str, ttl: Optional[int] = None) -> int:
+        """Add one and return the new value; ``ttl`` applies when the key is created"""
+        ...
+
+    def delete(self, key: str) -> None: ...
+
+    def publish(self, channel: str, message: str) -> None: ...
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> None: ...
+
+    def after_fork(self) -> None:
+        """Drop connections and threads inherited from a preloading parent process"""
+        ...
+
+
+class _LocalSubscribers:
+    """In-process fan-out shared by the backends without native pub/sub"""
+
+    def __init__(self):
+        self._callbacks: dict[str, list[Callable[[str], None]]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> None:
+        with self._lock:
+            self._callbacks.setdefault(channel, []).append(callback)
+
+    def channels(self) -> list[str]:
+        with self._lock:
+            return list(self._callbacks)
+
+    def publish(self, channel: str, message: str) -> None:
+        with self._lock:
+            callbacks = list(self._callbacks.get(channel, ()))
+        for callback in callbacks:
+            try:
+                callback(message)
+            except Exception:
+                logger.exception("Cache subscriber failed on channel %s", channel)
+
+
+class MemoryCacheBackend:
+    """Process-local backend, also used as the fake backend in tests
+
+    Expired keys are dropped when read, and by a sweep at most every
+    ``SWEEP_INTERVAL`` seconds on write, so one-off keys such as rate-limit
+    windows and idempotency keys don't accumulate.
+    """
+
+    SWEEP_INTERVAL = 60.0
+
+    def __init__(self):
+        self._data: dict[str, tuple[str, Optional[float]]] = {}
+        self._lock = threading.Lock()
+        self._subscribers = _LocalSubscribers()
+        self._next_sweep = 0.0
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            with self._lock:
+                if self._data.get(key) is entry:
+                    del self._data[key]
+            return None
+        return value
+
+    def _sweep(self, now: float) -> None:
+        """Drop expired keys; call with the lock held"""
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.SWEEP_INTERVAL
+        expired = [
+            key for key, (_, expires_at) in self._data.items()
+            if expires_at is not None and expires_at <= now
+        ]
+        for key in expired:
+            del self._data[key]
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None) -> None:
+        now = time.monotonic()
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            self._sweep(now)
+            self._data[key] = (value, expires_at)
+
+    def incr(self, key: str, ttl: Optional[int] = None) -> int:
+        with self._lock:
+            now = time.monotonic()
+            self._sweep(now)
+            value, expires_at = self._data.get(key, ("0", None))
+            if expires_at is not None and expires_at <= now:
+                value, expires_at = "0", None
+            if value == "0" and ttl:
+                expires_at = now + ttl
+            new_value = int(value) + 1
+            self._data[key] = (str(new_value), expires_at)
+        return new_value
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def publish(self, channel: str, message: str) -> None:
+        self._subscribers.publish(channel, message)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> None:
+        self._subscribers.subscribe(channel, callback)
+
+    def after_fork(self) -> None:
+        pass
+
+
+class SQLiteCacheBackend:
+    """Single-host backend shared by every worker that opens the same file.
+
+    SQLite has no pub/sub, so ``publish`` appends to an event table as well as
+    calling this process's subscribers. Once something subscribes, a thread
+    polls that table every ``CACHE_SQLITE_POLL_SECONDS`` for messages from
+    other processes and drops events older than ``EVENT_RETENTION_SECONDS``.
+
+    Expired entries are filtered out on read and deleted by each process at
+    most every ``SWEEP_INTERVAL`` seconds on write; the file usually lives in
+    /dev/shm, i.e. in RAM.
+    """
+
+    EVENT_RETENTION_SECONDS = 60
+    SWEEP_INTERVAL = 60.0
+
+    def __init__(self, path: str):
+        self._path = path
+        self._local = threading.local()
+        self._subscribers = _LocalSubscribers()
+        self._poll_lock = threading.Lock()
+        self._poll_thread: Optional[threading.Thread] = None
+        self._next_sweep = 0.0
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+        # AUTOINCREMENT so ids only grow, even after old events are pruned
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, "
+            "message TEXT NOT NULL, origin INTEGER NOT NULL, created_at REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT value FROM cache_entries WHERE key = ? "
+            "AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def _sweep(self, now: float) -> None:
+        if now < self._next_sweep:
+            return
+        # Claimed before deleting so concurrent writers in this process skip it
+        self._next_sweep = now + self.SWEEP_INTERVAL
+        self._conn().execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None) -> None:
+        now = time.time()
+        self._sweep(now)
+        expires_at = now + ttl if ttl else None
+        self._conn().execute(
+            "INSERT INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, "
+            "expires_at = excluded.expires_at",
+            (key, value, expires_at),
+        )
+
+    def incr(self, key: str, ttl: Optional[int] = None) -> int:
+        now = time.time()
+        self._sweep(now)
+        expires_at = now + ttl if ttl else None
+        # An expired row starts over as if it had just been created
+        row = self._conn().execute(
+            "INSERT INTO cache_entries (key, value, expires_at) VALUES (?, '1', ?) "
+            "ON CONFLICT(key) DO UPDATE SET "
+            "value = CASE WHEN expires_at <= ? THEN 1 ELSE CAST(value AS INTEGER) + 1 END, "
+            "expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END "
+            "RETURNING value",
+            (key, expires_at, now, now),
+        ).fetchone()
+        return int(row[0])
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def publish(self, channel: str, message: str) -> None:
+        self._conn().execute(
+            "INSERT INTO cache_events (channel, message, origin, created_at) VALUES (?, ?, ?, ?)",
+            (channel, message, os.getpid(), time.time()),
+        )
+        # Subscribers in this process are called directly; the poller skips our own rows
+        self._subscribers.publish(channel, message)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> None:
+        self._subscribers.subscribe(channel, callback)
+        self._start_polling()
+
+    def _start_polling(self) -> None:
+        with self._poll_lock:
+            if self._poll_thread is not None:
+                return
+            # Only messages published from now on are delivered
+            last_id = self._conn().execute("SELECT COALESCE(MAX(id), 0) FROM cache_events").fetchone()[0]
+            self._poll_thread = threading.Thread(
+                target=self._poll, args=(last_id, os.getpid()), name="sqlite-cache-events", daemon=True
+            )
+            self._poll_thread.start()
+
+    def _poll(self, last_id: int, pid: int) -> None:
+        next_prune = 0.0
+        while True:
+            time.sleep(settings.CACHE_SQLITE_POLL_SECONDS)
+            try:
+                conn = self._conn()
+                rows = conn.execute(
+                    "SELECT id, channel, message FROM cache_events "
+                    "WHERE id > ? AND origin != ? ORDER BY id",
+                    (last_id, pid),
+                ).fetchall()
+                now = time.time()
+                if now >= next_prune:
+                    conn.execute(
+                        "DELETE FROM cache_events WHERE created_at <= ?",
+                        (now - self.EVENT_RETENTION_SECONDS,),
+                    )
+                    next_prune = now + self.EVENT_RETENTION_SECONDS
+            except sqlite3.Error:
+                logger.warning("Polling the cache event table failed", exc_info=True)
+                continue
+            for event_id, channel, message in rows:
+                last_id = event_id
+                self._subscribers.publish(channel, message)
+
+    def after_fork(self) -> None:
+        # SQLite connections must not be used across fork; open fresh ones lazily.
+        # The poller stayed behind in the parent, so start this process's own.
+        self._local = threading.local()
+        self._poll_thread = None
+        if self._subscribers.channels():
+            self._start_polling()
+
+
+class RedisCacheBackend:
+    """Backend for any server speaking the Redis protocol"""
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "CACHE_URL points at Redis but the 'redis' package is not installed"
+            ) from e
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+        self._pubsub = None
+        self._pubsub_thread = None
+        self._handlers: dict[str, Callable[[str], None]] = {}
+
+    def get(self, key: str) -> Optional[str]:
+        return self._client.get(key)
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None) -> None:
+        self._client.set(key, value, ex=ttl or None)
+
+    def incr(self, key: str, ttl: Optional[int] = None) -> int:
+        if not ttl:
+            return int(self._client.incr(key))
+        pipe = self._client.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, ttl, nx=True)
+        return int(pipe.execute()[0])
+
+    def delete(self, key: str) -> None:
+        self._client.delete(key)
+
+    def publish(self, channel: str, message: str) -> None:
+        self._client.publish(channel, message)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> None:
+        self._handlers[channel] = callback
+        if self._pubsub is None:
+            self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{channel: lambda message: callback(message["data"])})
+        if self._pubsub_thread is None:
+            self._pubsub_thread = self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def after_fork(self) -> None:
+        # The client's pool reconnects on its own after fork, but the pub/sub
+        # listener thread stayed behind in the parent
+        self._pubsub = None
+        self._pubsub_thread = None
+        for channel, callback in list(self._handlers.items()):
+            self.subscribe(channel, callback)
+
+
+def build_cache_backend(url: str) -> CacheBackend:
+    """Create the cache backend described by a CACHE_URL"""
+    if url.startswith("memory://"):
+        return MemoryCacheBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteCacheBackend(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCacheBackend(url)
+    raise ValueError(f"Unsupported CACHE_URL: {url}")
+
+
+class CatalogCache:
+    """Formatted product catalog shared through a CacheBackend"""
+
+    PRODUCTS_KEY = "balm:catalog:products"
+    VERSION_KEY = "balm:catalog:version"
+    INVALIDATE_CHANNEL = "balm:catalog:invalidate"
+    REFRESH_LEASE_KEY = "balm:catalog:refresh-lease"
+
+    def __init__(self, backend: CacheBackend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+        # (version, expires_at, products) of the last payload this worker decoded
+        self._local: Optional[tuple[int, float, list[dict[str, Any]]]] = None
+        backend.subscribe(self.INVALIDATE_CHANNEL, self._on_message)
+
+    def version(self) -> int:
+        """Current catalog version; read it before fetching from Stripe"""
+        return int(self.backend.get(self.VERSION_KEY) or 0)
+
+    def get_products(self) -> Optional[list[dict[str, Any]]]:
+        """Return the cached catalog, or None when missing or stale"""
+        version = self.version()
+        local = self._local
+        if local is not None and local[0] == version and local[1] > time.monotonic():
+            CACHE_REQUESTS.inc("catalog", "hit")
+            return local[2]
+
+        raw = self.backend.get(self.PRODUCTS_KEY)
+        if raw is None:
+            CACHE_REQUESTS.inc("catalog", "miss")
+            return None
+        payload = json.loads(raw)
+        if payload.get("version") != version:
+            CACHE_REQUESTS.inc("catalog", "stale")
+            return None
+        CACHE_REQUESTS.inc("catalog", "shared_hit")
+        products = payload["products"]
+        self._local = (version, time.monotonic() + payload.get("ttl", self.ttl), products)
+        return products
+
+    def set_products(self, products: list[dict[str, Any]], version: int) -> None:
+        """Store a catalog fetched while ``version`` was current.
+
+        If an invalidation lands during the fetch the stamp no longer matches
+        and readers treat the entry as a miss instead of serving stale stock.
+        """
+        payload = json.dumps(
+            {"version": version, "ttl": self.ttl, "stored_at": time.time(), "products": products},
+            separators=(",", ":"),
+        )
+        self.backend.set(self.PRODUCTS_KEY, payload, ttl=self.ttl)
+        self._local = (version, time.monotonic() + self.ttl, products)
+
+    def expires_in(self) -> Optional[float]:
+        """Seconds until the shared entry expires; None when missing or stale"""
+        raw = self.backend.get(self.PRODUCTS_KEY)
+        if raw is None:
+            return None
+        payload = json.loads(raw)
+        if payload.get("version") != self.version() or "stored_at" not in payload:
+            return None
+        return payload["stored_at"] + payload.get("ttl", self.ttl) - time.time()
+
+    def claim_refresh(self, lease_seconds: int) -> bool:
+        """Whether this process may refresh from Stripe; one claim per lease across the backend"""
+        return self.backend.incr(self.REFRESH_LEASE_KEY, ttl=lease_seconds) == 1
+
+    def release_refresh(self) -> None:
+        """Give up the refresh lease after a failed pull so the next attempt needn't wait it out"""
+        self.backend.delete(self.REFRESH_LEASE_KEY)
+
+    def invalidate(self, reason: str = "") -> int:
+        """Bump the catalog version and notify subscribers"""
+        version = self.backend.incr(self.VERSION_KEY)
+        self._local = None
+        self.backend.publish(
+            self.INVALIDATE_CHANNEL, json.dumps({"version": version, "reason": reason})
+        )
+        logger.info("Catalog cache invalidated (v%d): %s", version, reason)
+        return version
+
+    def _on_message(self, message: str) -> None:
+        # Drop the decoded copy at once rather than on the next version check
+        self._local = None
+
+
+# One backend per process, shared by every cache built on it
+shared_backend = build_cache_backend(settings.CACHE_URL)
+
+catalog_cache = CatalogCache(shared_backend, ttl=settings.CATALOG_CACHE_TTL_SECONDS)
@@ -0,0 +1,82 @@
+"""Server-side cart resolution against the catalog.
+
+Clients only say which product, size and quantity they want. Prices come
+from the catalog, so Stripe gets canonical ``price`` references and never
+creates throwaway prices from client-supplied amounts.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from app.core.catalog import CatalogEntry, CatalogIndex
+from app.core.reservations import StockKey
+
+
+class InvalidCartError(Exception):
+    """Raised with every problem found in a cart, not just the first"""
+
+    def __init__(self, problems: list[dict[str, Any]]):
+        super().__init__(f"{len(problems)} invalid cart item(s)")
+        self.problems = problems
+
+
+@dataclass
+class ResolvedItem:
+    entry: CatalogEntry
+    size: Optional[str]
+    quantity: int
+
+
+@dataclass
+class ResolvedCart:
+    items: list[ResolvedItem] = field(default_factory=list)
+    # Units requested per inventory-tracked (product, size), and their stock
+    requested: dict[StockKey, int] = field(default_factory=dict)
+    stock: dict[StockKey, int] = field(default_factory=dict)
+
+    @property
+    def unavailable(self) -> list[StockKey]:
+        return [key for key, qty in self.requested.items() if qty > self.stock[key]]
+
+
+def resolve_cart(items: list[Any], index: CatalogIndex) -> ResolvedCart:
+    """Validate a whole cart in one pass.
+
+    ``items`` are CheckoutItem-like objects with ``stripeProductId``,
+    ``productId``, ``price``, ``size`` and ``quantity``. Raises
+    InvalidCartError listing every unknown product, unpriced product, bad
+    size or bad quantity.
+    """
+    cart = ResolvedCart()
+    problems: list[dict[str, Any]] = []
+
+    for position, item in enumerate(items):
+        product_id = item.stripeProductId or item.productId
+        entry = index.by_product.get(product_id) if product_id else None
+        if entry is None and item.price:
+            entry = index.by_price.get(item.price)
+        if entry is None:
+            problems.append({"item": position, "error": "Unknown product"})
+            continue
+        if not entry.price_id:
+            problems.append({"item": position, "error": "Product has no price"})
+            continue
+
+        quantity = item.quantity if item.quantity is not None else 1
+        if quantity < 1:
+            problems.append({"item": position, "error": "Quantity must be at least 1"})
+            continue
+
+        size = item.size
+        if entry.sizes and size not in entry.sizes:
+            problems.append({"item": position, "error": f"Invalid size: {size}"})
+            continue
+
+        cart.items.append(ResolvedItem(entry=entry, size=size, quantity=quantity))
+        if size and entry.inventory is not None and size in entry.inventory:
+            key = (entry.product_id, size)
+            cart.requested[key] = cart.requested.get(key, 0) + quantity
+            cart.stock[key] = entry.inventory[size]
+
+    if problems:
+        raise InvalidCartError(problems)
+    return cart
@@ -0,0 +1,350 @@
+"""Product catalog loading.
+
+Reads go through the shared catalog cache first. On a miss the catalog is
+pulled from Stripe behind a circuit breaker, and every good pull refreshes
+the last-known-good snapshot on disk. When Stripe fails, is slow, or the
+breaker is open, the most recent snapshot is served instead. Only one request
+per worker refetches after a miss; the others wait for it and read its result.
+
+Workers warm the catalog at startup and re-pull it on a jittered schedule
+ahead of the cache TTL, so shoppers rarely pay for a Stripe fetch. Both start
+from the shared cache: a worker only goes to Stripe when the entry is missing
+or close to expiry and it holds the refresh lease, so one process per period
+does the pull for all of them.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import stripe
+
+from app.core.cache import catalog_cache
+from app.core.circuit_breaker import CircuitBreaker
+from app.core.config import settings
+from app.core.metrics import upstream_call
+from app.core.snapshot import CatalogSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+LOCAL_PRODUCT_IMAGES: dict[str, dict[str, Any]] = {
+    "prod_URjiesOVeb9YC9": {
+        "images": [
+            "/img/products/balm-cursive.png",
+        ],
+        "sizeChart": {
+            "sizes": ["S", "M", "L", "XL", "2XL", "3XL"],
+            "measurements": {
+                "S": {"bodyLength": "27 1/2", "chestWidth": "21 1/2", "sleeveLength": "34"},
+                "M": {"bodyLength": "28 1/2", "chestWidth": "23", "sleeveLength": "35"},
+                "L": {"bodyLength": "29 1/2", "chestWidth": "24 1/2", "sleeveLength": "36"},
+                "XL": {"bodyLength": "30 1/2", "chestWidth": "26", "sleeveLength": "37"},
+                "2XL": {"bodyLength": "31", "chestWidth": "27 1/2", "sleeveLength": "38"},
+                "3XL": {"bodyLength": "31 1/2", "chestWidth": "29", "sleeveLength": "38 3/4"},
+            },
+        },
+    }
+}
+
+
+def format_product(product: Any) -> dict[str, Any]:
+    metadata = product.get("metadata") or {}
+    price = product.get("default_price")
+    price_amount = (price.get("unit_amount") / 100) if price and price.get("unit_amount") is not None else 0
+
+    sizes_raw = metadata.get("sizes", "")
+    sizes = [s.strip() for s in sizes_raw.split(",")] if sizes_raw else []
+
+    inventory: dict[str, int] = {}
+    for size in sizes:
+        stock_key = f"stock_{size}"
+        if metadata.get(stock_key) is not None:
+            try:
+                inventory[size] = int(metadata[stock_key])
+            except (TypeError, ValueError):
+                inventory[size] = 0
+
+    local_data = LOCAL_PRODUCT_IMAGES.get(product["id"], {})
+    local_images = local_data.get("images") or []
+    stripe_images = product.get("images") or []
+    # Prefer local override so we control the canonical product imagery; fall back to Stripe.
+    product_images = local_images if local_images else stripe_images
+    main_image = product_images[0] if product_images else "/img/products/placeholder-product.svg"
+
+    colors_raw = metadata.get("colors", "")
+
+    return {
+        "id": product["id"],
+        "stripeProductId": product["id"],
+        "stripePriceId": price.get("id") if price else None,
+        "title": product.get("name"),
+        "price": price_amount,
+        "description": product.get("description") or "",
+        "image": main_image,
+        "images": product_images,
+        "mainCategory": metadata.get("category", "art"),
+        "sizes": sizes,
+        "colors": [c.strip() for c in colors_raw.split(",")] if colors_raw else [],
+        "details": metadata.get("details", ""),
+        "inventory": inventory if inventory else None,
+        "sizeChart": local_data.get("sizeChart"),
+        "metadata": metadata,
+    }
+
+
+class CatalogUnavailableError(Exception):
+    """Raised when Stripe cannot be reached and there is no snapshot"""
+
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    """What checkout needs to know about one product"""
+
+    product_id: str
+    price_id: Optional[str]
+    sizes: frozenset[str]
+    # Stock per size, or None when the product isn't inventory-tracked
+    inventory: Optional[dict[str, int]]
+
+
+class CatalogIndex:
+    """O(1) lookups of catalog entries by product ID and price ID"""
+
+    def __init__(self, products: list[dict[str, Any]]):
+        self.by_product: dict[str, CatalogEntry] = {}
+        self.by_price: dict[str, CatalogEntry] = {}
+        for product in products:
+            entry = CatalogEntry(
+                product_id=product["id"],
+                price_id=product.get("stripePriceId"),
+                sizes=frozenset(product.get("sizes") or ()),
+                inventory=product.get("inventory"),
+            )
+            self.by_product[entry.product_id] = entry
+            if entry.price_id:
+                self.by_price[entry.price_id] = entry
+
+
+@dataclass
+class CatalogResult:
+    products: list[dict[str, Any]]
+    # Seconds since the snapshot was taken, or None for live data
+    stale_seconds: Optional[float] = None
+
+
+breaker = CircuitBreaker(
+    failure_threshold=settings.CATALOG_BREAKER_FAILURES,
+    reset_timeout=settings.CATALOG_BREAKER_RESET_SECONDS,
+    slow_call_seconds=settings.CATALOG_BREAKER_SLOW_SECONDS,
+)
+snapshot = CatalogSnapshot(settings.CATALOG_SNAPSHOT_PATH)
+
+# (products, created_at) of the newest last-known-good catalog in this worker
+_last_good: Optional[tuple[list[dict[str, Any]], float]] = None
+_last_good_lock = threading.Lock()
+
+# Refresh at this fraction of the cache TTL, spread by +/- REFRESH_JITTER
+REFRESH_FRACTION = 0.8
+REFRESH_JITTER = 0.1
+RETRY_SECONDS = 5.0
+# How often a booting worker looks for a catalog another worker is fetching
+WARM_UP_POLL_SECONDS = 1.0
+
+_ready = threading.Event()
+
+# Held by the request refetching after a cache miss
+_refresh_lock = threading.Lock()
+
+
+def is_ready() -> bool:
+    """Whether this worker has finished warming the catalog"""
+    return _ready.is_set()
+
+
+def load_snapshot() -> bool:
+    """Load the on-disk snapshot into memory; called at worker startup"""
+    global _last_good
+    loaded = snapshot.load()
+    if loaded is None:
+        return False
+    with _last_good_lock:
+        if _last_good is None or loaded[1] > _last_good[1]:
+            _last_good = loaded
+    logger.info("Loaded catalog snapshot with %d products", len(loaded[0]))
+    return True
+
+
+def fetch_products() -> list[dict[str, Any]]:
+    """Pull and format the active catalog from Stripe"""
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    stripe.api_base = settings.STRIPE_API_BASE
+    with upstream_call("stripe", "Product.list"):
+        products = stripe.Product.list(
+            active=True,
+            expand=["data.default_price"],
+            limit=100,
+        )
+    return [format_product(p) for p in products.data]
+
+
+def _remember(products: list[dict[str, Any]], version: int) -> None:
+    global _last_good
+    with _last_good_lock:
+        _last_good = (products, time.time())
+    snapshot.save(products, version)
+
+
+def _fallback(message: str, status_code: int) -> CatalogResult:
+    last_good = _last_good
+    if last_good is None:
+        raise CatalogUnavailableError(message, status_code)
+    products, created_at = last_good
+    logger.warning("Serving catalog snapshot: %s", message)
+    return CatalogResult(products, stale_seconds=max(0.0, time.time() - created_at))
+
+
+def get_catalog() -> CatalogResult:
+    """Return the catalog from cache, Stripe or the last-known-good snapshot"""
+    cached = catalog_cache.get_products()
+    if cached is not None:
+        return CatalogResult(cached)
+
+    if not _refresh_lock.acquire(timeout=settings.CATALOG_BREAKER_SLOW_SECONDS):
+        return _fallback("Catalog refresh is taking too long", 503)
+    try:
+        # Whoever held the lock before us has usually refilled the cache
+        cached = catalog_cache.get_products()
+        if cached is not None:
+            return CatalogResult(cached)
+        products = refresh_catalog()
+    except CatalogUnavailableError as e:
+        return _fallback(str(e), e.status_code)
+    except stripe.error.StripeError as e:
+        return _fallback(str(e.user_message or e), 500)
+    finally:
+        _refresh_lock.release()
+    return CatalogResult(products)
+
+
+_index: Optional[tuple[list[dict[str, Any]], CatalogIndex]] = None
+
+
+def get_catalog_index() -> CatalogIndex:
+    """Index over the current catalog, rebuilt only when the catalog changes"""
+    global _index
+    products = get_catalog().products
+    index = _index
+    if index is None or index[0] is not products:
+        index = _index = (products, CatalogIndex(products))
+    return index[1]
+
+
+def refresh_catalog() -> list[dict[str, Any]]:
+    """Pull the catalog from Stripe even if the cache is still warm"""
+    if not breaker.allow():
+        raise CatalogUnavailableError("Stripe circuit breaker is open", 503)
+
+    version = catalog_cache.version()
+    started = time.perf_counter()
+    try:
+        products = fetch_products()
+    except Exception:
+        # Any error, not just Stripe's, must end a half-open probe
+        breaker.record_failure()
+        raise
+    breaker.record_success(time.perf_counter() - started)
+
+    catalog_cache.set_products(products, version)
+    _remember(products, version)
+    return products
+
+
+def _next_refresh_delay() -> float:
+    base = settings.CATALOG_CACHE_TTL_SECONDS * REFRESH_FRACTION
+    return base * random.uniform(1 - REFRESH_JITTER, 1 + REFRESH_JITTER)
+
+
+def _refresh_margin() -> float:
+    """Remaining lifetime below which the shared entry is due for a refresh"""
+    return settings.CATALOG_CACHE_TTL_SECONDS * (1 - REFRESH_FRACTION)
+
+
+def _lease_seconds() -> int:
+    # One refresher per refresh period; a crashed holder only delays the next one
+    return max(1, int(_refresh_margin()))
+
+
+def _adopt(products: list[dict[str, Any]]) -> None:
+    """Keep a catalog another worker fetched as this worker's fallback"""
+    global _last_good
+    with _last_good_lock:
+        _last_good = (products, time.time())
+
+
+async def warm_up_catalog() -> None:
+    """Load the catalog at startup from the shared cache or Stripe, retrying until it succeeds"""
+    if not settings.STRIPE_SECRET_KEY:
+        _ready.set()
+        return
+
+    while True:
+        cached = await asyncio.to_thread(catalog_cache.get_products)
+        if cached is not None:
+            _adopt(cached)
+            logger.info("Catalog warmed from the shared cache with %d products", len(cached))
+            _ready.set()
+            return
+        if not await asyncio.to_thread(catalog_cache.claim_refresh, _lease_seconds()):
+            # Another worker is fetching it
+            await asyncio.sleep(WARM_UP_POLL_SECONDS)
+            continue
+        try:
+            products = await asyncio.to_thread(refresh_catalog)
+        except (stripe.error.StripeError, CatalogUnavailableError) as e:
+            await asyncio.to_thread(catalog_cache.release_refresh)
+            if _last_good is not None:
+                logger.warning("Catalog warm-up failed, serving snapshot: %s", e)
+                _ready.set()
+                return
+            logger.warning("Catalog warm-up failed, retrying in %.0fs: %s", RETRY_SECONDS, e)
+            await asyncio.sleep(RETRY_SECONDS)
+            continue
+        logger.info("Catalog warmed with %d products", len(products))
+        _ready.set()
+        return
+
+
+async def refresh_catalog_periodically() -> None:
+    """Re-pull the catalog before the cache entry expires; cancel to stop"""
+    if not settings.STRIPE_SECRET_KEY:
+        return
+
+    delay = _next_refresh_delay()
+    while True:
+        await asyncio.sleep(delay)
+        delay = _next_refresh_delay()
+        try:
+            remaining = await asyncio.to_thread(catalog_cache.expires_in)
+            if remaining is not None and remaining > _refresh_margin():
+                # Another worker refreshed it; come back when it nears expiry
+                delay = (remaining - _refresh_margin()) * random.uniform(1, 1 + REFRESH_JITTER)
+                continue
+            if not await asyncio.to_thread(catalog_cache.claim_refresh, _lease_seconds()):
+                continue
+            try:
+                await asyncio.to_thread(refresh_catalog)
+            except Exception:
+                await asyncio.to_thread(catalog_cache.release_refresh)
+                raise
+        except (stripe.error.StripeError, CatalogUnavailableError) as e:
+            logger.warning("Background catalog refresh failed: %s", e)
+        except Exception:
+            logger.exception("Background catalog refresh crashed")
@@ -0,0 +1,51 @@
+"""Circuit breaker for upstream calls (Stripe)"""
+import threading
+import time
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures or slow calls, then probes again.
+
+    While open, ``allow()`` returns False until ``reset_timeout`` has passed.
+    After that a single caller is let through (half-open). Its outcome closes
+    the breaker again or re-opens it for another ``reset_timeout``.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, slow_call_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.slow_call_seconds = slow_call_seconds
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether the caller may try the upstream now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self, elapsed: float) -> None:
+        """Record a completed call; slow calls count as failures"""
+        if elapsed > self.slow_call_seconds:
+            self.record_failure()
+            return
+        with self._lock:
+            self._failures = 0
+            self.state = self.CLOSED
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
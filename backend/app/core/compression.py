@@ -0,0 +1,211 @@
+"""Compression for API responses.
+
+``CompressionMiddleware`` compresses complete JSON/text responses of at least
+``API_COMPRESSION_MIN_BYTES`` with the best codec the client accepts
+(zstd, then brotli, then gzip) at the levels configured in Settings.
+Responses that already carry a Content-Encoding, such as precompressed
+static files and ``CompressedPayload`` bodies, pass through untouched, as do
+streamed responses, which are never buffered. So do partial (206) responses
+and anything advertising Accept-Ranges, i.e. everything from ``StaticSite``:
+byte ranges refer to the stored representation, and compressing it would
+make Content-Range describe a body the client never receives.
+
+``CompressedPayload`` is for bodies that many requests share (the catalog):
+it is serialized once and compressed at most once per encoding.
+"""
+import gzip
+import hashlib
+import threading
+from typing import Callable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is in requirements.txt
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is in requirements.txt
+    zstandard = None
+
+# Best first: zstd compresses fastest for a given ratio, brotli smallest
+PREFERENCE = ("zstd", "br", "gzip")
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml", "application/xml")
+
+
+def _codecs() -> dict[str, Callable[[bytes, int], bytes]]:
+    codecs = {"gzip": lambda data, level: gzip.compress(data, compresslevel=level, mtime=0)}
+    if brotli is not None:
+        codecs["br"] = lambda data, level: brotli.compress(data, quality=level)
+    if zstandard is not None:
+        codecs["zstd"] = lambda data, level: zstandard.ZstdCompressor(level=level).compress(data)
+    return codecs
+
+
+CODECS = _codecs()
+
+
+def default_level(encoding: str) -> int:
+    return {
+        "gzip": settings.API_GZIP_LEVEL,
+        "br": settings.API_BROTLI_QUALITY,
+        "zstd": settings.API_ZSTD_LEVEL,
+    }[encoding]
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    return CODECS[encoding](data, default_level(encoding) if level is None else level)
+
+
+def accepted_encodings(header: str) -> set[str]:
+    """Content codings the client accepts (q > 0) from Accept-Encoding"""
+    accepted = set()
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(name)
+    if "*" in accepted:
+        accepted.update(PREFERENCE)
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """The preferred codec both sides support, or None for identity"""
+    if not accept_encoding:
+        return None
+    accepted = accepted_encodings(accept_encoding)
+    for encoding in PREFERENCE:
+        if encoding in accepted and encoding in CODECS:
+            return encoding
+    return None
+
+
+def _is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    candidates = {value.strip().removeprefix("W/") for value in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+class CompressedPayload:
+    """A response body rendered once, compressed lazily once per encoding"""
+
+    def __init__(self, body: bytes, media_type: str = "application/json"):
+        self.body = body
+        self.media_type = media_type
+        self.etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        self._encoded: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: str) -> bytes:
+        data = self._encoded.get(encoding)
+        if data is None:
+            with self._lock:
+                data = self._encoded.get(encoding)
+                if data is None:
+                    data = self._encoded[encoding] = compress(self.body, encoding)
+        return data
+
+    def response(self, request: Request, headers: Optional[dict[str, str]] = None) -> Response:
+        headers = dict(headers or {})
+        headers["vary"] = "Accept-Encoding"
+        encoding = None
+        if len(self.body) >= settings.API_COMPRESSION_MIN_BYTES:
+            encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+        # Each encoding is a different representation, so it gets its own ETag
+        headers["etag"] = f'{self.etag[:-1]}-{encoding}"' if encoding else self.etag
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, headers["etag"]):
+            return Response(status_code=304, headers=headers)
+        if encoding is None:
+            return Response(self.body, headers=headers, media_type=self.media_type)
+        headers["content-encoding"] = encoding
+        return Response(self.encoded(encoding), headers=headers, media_type=self.media_type)
+
+
+class CompressionMiddleware:
+    """Plain ASGI middleware compressing complete, compressible responses"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                length = headers.get("content-length")
+                if (
+                    "content-encoding" in headers
+                    or message["status"] == 206
+                    or "content-range" in headers
+                    or "accept-ranges" in headers
+                    or not _is_compressible(headers.get("content-type", ""))
+                    or (length is not None and int(length) < settings.API_COMPRESSION_MIN_BYTES)
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Hold the start until we know the whole body and its size
+                    start = message
+                return
+
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False):
+                # Streamed (e.g. server-sent events): send as-is rather than buffer
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=list(start["headers"]))
+            if len(body) >= settings.API_COMPRESSION_MIN_BYTES:
+                body = compress(body, encoding)
+                headers["content-encoding"] = encoding
+                headers["content-length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+                if "etag" in headers and not headers["etag"].startswith("W/"):
+                    headers["etag"] = "W/" + headers["etag"]
+            await send({**start, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
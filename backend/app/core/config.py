@@ -1,7 +1,13 @@
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 from typing import Optional
 
 
+# Added to every checkout expiry so clock truncation, the hold and the Stripe
+# round trip can't push a session below Stripe's 30-minute minimum
+CHECKOUT_EXPIRY_MARGIN_SECONDS = 120
+
+
 class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite:///./store.db"
@@ -27,16 +33,104 @@ class Settings(BaseSettings):
     GOOGLE_CLIENT_ID: Optional[str] = None
     GOOGLE_CLIENT_SECRET: Optional[str] = None
     GOOGLE_REDIRECT_URI: str = "http://localhost:8000/api/auth/google/callback"
+    # Overridable so load tests can point at a fake Google (scripts/fake_upstreams.py)
+    GOOGLE_TOKEN_URL: str = "https://oauth2.googleapis.com/token"
+    GOOGLE_USERINFO_URL: str = "https://www.googleapis.com/oauth2/v2/userinfo"
     
     # Stripe
     STRIPE_SECRET_KEY: Optional[str] = None
     STRIPE_PUBLISHABLE_KEY: Optional[str] = None
     STRIPE_WEBHOOK_SECRET: Optional[str] = None
+    # Overridable so load tests can point at a fake Stripe
+    STRIPE_API_BASE: str = "https://api.stripe.com"
+
+    # Shared catalog cache
+    # memory:// (per process), sqlite:///path/cache.db (single host) or redis://host:6379/0
+    CACHE_URL: str = "memory://"
+    # How often workers sharing a SQLite cache poll for each other's published events
+    CACHE_SQLITE_POLL_SECONDS: float = 0.5
+    CATALOG_CACHE_TTL_SECONDS: int = 300
+
+    # Last-known-good catalog snapshot, served while Stripe is failing or slow
+    CATALOG_SNAPSHOT_PATH: str = "./catalog.snapshot"
+    CATALOG_BREAKER_FAILURES: int = 3
+    CATALOG_BREAKER_RESET_SECONDS: int = 30
+    CATALOG_BREAKER_SLOW_SECONDS: float = 5.0
+
+    # Checkout sessions expire after this long (Stripe allows 30 min to 24 h);
+    # stock stays reserved for the session until then
+    CHECKOUT_HOLD_MINUTES: int = 30
+    # Repeats of the same cart from the same client reuse the session this long
+    CHECKOUT_IDEMPOTENCY_SECONDS: int = 60
 
     # Email Configuration (Resend)
     RESEND_API_KEY: Optional[str] = None
     EMAIL_FROM: str = "noreply@balmsoothes.com"
     EMAIL_FROM_NAME: str = "BALM Store"
+    RESEND_API_URL: str = "https://api.resend.com"  # Point at a fake Resend for local testing
+
+    # Email outbox sender
+    EMAIL_OUTBOX_BATCH_SIZE: int = 100  # Resend's batch limit
+    EMAIL_OUTBOX_CONCURRENCY: int = 4
+    EMAIL_OUTBOX_POLL_SECONDS: float = 2.0
+    EMAIL_OUTBOX_RETRY_SECONDS: int = 30  # Doubles on each failed attempt
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = 6
+
+    # Prometheus /metrics; when set, scrapers must send "Authorization: Bearer <token>"
+    METRICS_TOKEN: Optional[str] = None
+
+    # Browser cache lifetime for index.html; hashed /assets are immutable
+    STATIC_HTML_MAX_AGE_SECONDS: int = 60
+    # Reload the in-memory dist manifest when files change (for `vite build --watch`)
+    STATIC_WATCH: bool = False
+
+    # API response compression (zstd, brotli or gzip, per Accept-Encoding);
+    # see scripts/bench_api_compression.py for the CPU vs size trade-off
+    API_COMPRESSION_MIN_BYTES: int = 1024
+    API_GZIP_LEVEL: int = 6
+    API_BROTLI_QUALITY: int = 5
+    API_ZSTD_LEVEL: int = 3
+
+    # Requests sent with "X-Trace: <token>" get a Server-Timing breakdown
+    # (db, bcrypt, jwt, stripe, ...). Tracing is off while this is unset.
+    PROFILING_TRACE_TOKEN: Optional[str] = None
+
+    # Throttling for the bcrypt-backed auth endpoints (429 + Retry-After).
+    # Login and /token share the per-IP and per-email buckets.
+    RATE_LIMIT_ENABLED: bool = True
+    # Count in the shared CACHE_URL backend instead of per worker process
+    RATE_LIMIT_SHARED: bool = False
+    # Proxies in front of the app that append to X-Forwarded-For. 0 uses the
+    # socket peer; the Railway and Render configs set 1 for their one proxy.
+    RATE_LIMIT_PROXY_HOPS: int = 0
+    AUTH_RATE_LIMIT_IP_BURST: int = 20
+    AUTH_RATE_LIMIT_IP_PER_MINUTE: float = 10
+    AUTH_RATE_LIMIT_EMAIL_BURST: int = 5
+    AUTH_RATE_LIMIT_EMAIL_PER_MINUTE: float = 2
+    REGISTER_RATE_LIMIT_IP_BURST: int = 5
+    REGISTER_RATE_LIMIT_IP_PER_MINUTE: float = 1
+    # Restock sign-ups send mail to the address given, so they are throttled too
+    RESTOCK_RATE_LIMIT_IP_BURST: int = 10
+    RESTOCK_RATE_LIMIT_IP_PER_MINUTE: float = 2
+    RESTOCK_RATE_LIMIT_EMAIL_BURST: int = 5
+    RESTOCK_RATE_LIMIT_EMAIL_PER_MINUTE: float = 0.5
+
+    # Production launcher (gunicorn.conf.py). Workers default to one per CPU;
+    # each is replaced after roughly WORKER_MAX_REQUESTS requests, and gets
+    # WORKER_GRACEFUL_TIMEOUT seconds to drain on SIGTERM.
+    WEB_CONCURRENCY: Optional[int] = None
+    WORKER_MAX_REQUESTS: int = 10000
+    WORKER_MAX_REQUESTS_JITTER: int = 1000
+    WORKER_GRACEFUL_TIMEOUT: int = 30
+
+    # Restock notifications are queued this many subscribers at a time
+    RESTOCK_CHUNK_SIZE: int = 500
+
+    # Live stock stream (/api/products/stream). Clients further behind than
+    # the queue are disconnected; recent events are kept for Last-Event-ID.
+    STOCK_STREAM_HEARTBEAT_SECONDS: float = 15
+    STOCK_STREAM_QUEUE_SIZE: int = 64
+    STOCK_STREAM_HISTORY: int = 1000
     
     # Password Reset Token Expiry (in minutes)
     PASSWORD_RESET_TOKEN_EXPIRE_MINUTES: int = 30
@@ -49,6 +143,23 @@ class Settings(BaseSettings):
             return [origin.strip() for origin in self.CORS_ORIGINS.split(",") if origin.strip()]
         return self.CORS_ORIGINS if isinstance(self.CORS_ORIGINS, list) else []
     
+    @model_validator(mode="after")
+    def _check_checkout_expiry(self) -> "Settings":
+        # Sessions expire between CHECKOUT_HOLD_MINUTES plus the margin and that
+        # plus one idempotency window from creation; Stripe rejects anything
+        # outside 30 min to 24 h, and only after stock has been reserved
+        hold_seconds = self.CHECKOUT_HOLD_MINUTES * 60
+        latest = hold_seconds + CHECKOUT_EXPIRY_MARGIN_SECONDS + self.CHECKOUT_IDEMPOTENCY_SECONDS
+        if self.CHECKOUT_IDEMPOTENCY_SECONDS < 1:
+            raise ValueError("CHECKOUT_IDEMPOTENCY_SECONDS must be at least 1")
+        if hold_seconds < 30 * 60 or latest > 24 * 3600:
+            raise ValueError(
+                "CHECKOUT_HOLD_MINUTES must be at least 30, and CHECKOUT_HOLD_MINUTES plus "
+                f"CHECKOUT_IDEMPOTENCY_SECONDS plus {CHECKOUT_EXPIRY_MARGIN_SECONDS}s at most "
+                "24 hours (Stripe's expires_at range)"
+            )
+        return self
+
     class Config:
         env_file = ".env"
         case_sensitive = True
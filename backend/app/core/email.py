@@ -1,6 +1,10 @@
 """Email service for sending transactional emails"""
 import resend
 from app.core.config import settings
+from app.core.email_outbox import enqueue_email
+from app.core.email_templates import templates
+from app.core.metrics import upstream_call
+from app.db.database import SessionLocal
 import logging
 
 logger = logging.getLogger(__name__)
@@ -33,7 +37,8 @@ class EmailService:
                 params["text"] = text_content
             
             # Send email
-            response = resend.Emails.send(params)
+            with upstream_call("resend", "Emails.send"):
+                response = resend.Emails.send(params)
             
             logger.info(f"Email sent successfully: {subject} to {to_email} (ID: {response.get('id', 'unknown')})")
             return True
@@ -42,151 +47,64 @@ class EmailService:
             logger.error(f"Error sending email: {str(e)}")
             return False
     
+    @staticmethod
+    def queue_email(to_email: str, subject: str, html_content: str, text_content: str = None,
+                    dedupe_key: str = None):
+        """Queue an email for the background outbox sender"""
+        if not settings.RESEND_API_KEY:
+            logger.warning(f"Email not queued (Resend not configured): {subject} to {to_email}")
+            return False
+
+        db = SessionLocal()
+        try:
+            enqueue_email(db, to_email, subject, html_content, text_content, dedupe_key)
+        except Exception as e:
+            logger.error(f"Error queueing email: {str(e)}")
+            return False
+        finally:
+            db.close()
+        return True
+
     @staticmethod
     def send_password_reset_email(to_email: str, reset_token: str):
         """Send password reset email"""
-        reset_url = f"{settings.FRONTEND_URL}/reset-password?token={reset_token}"
-        
-        html_content = f"""
-        <html>
-            <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h2 style="color: #333;">Reset Your Password</h2>
-                <p>You requested to reset your password for your BALM Store account.</p>
-                <p>Click the button below to reset your password:</p>
-                <p style="margin: 30px 0;">
-                    <a href="{reset_url}" 
-                       style="background-color: #000; color: #fff; padding: 12px 30px; 
-                              text-decoration: none; border-radius: 5px; display: inline-block;">
-                        Reset Password
-                    </a>
-                </p>
-                <p style="color: #666; font-size: 14px;">
-                    This link will expire in {settings.PASSWORD_RESET_TOKEN_EXPIRE_MINUTES} minutes.
-                </p>
-                <p style="color: #666; font-size: 14px;">
-                    If you didn't request this, you can safely ignore this email.
-                </p>
-                <hr style="border: none; border-top: 1px solid #ddd; margin: 30px 0;">
-                <p style="color: #999; font-size: 12px;">
-                    BALM Store | balmsoothes.com
-                </p>
-            </body>
-        </html>
-        """
-        
-        text_content = f"""
-        Reset Your Password
-        
-        You requested to reset your password for your BALM Store account.
-        
-        Click this link to reset your password:
-        {reset_url}
-        
-        This link will expire in {settings.PASSWORD_RESET_TOKEN_EXPIRE_MINUTES} minutes.
-        
-        If you didn't request this, you can safely ignore this email.
-        
-        BALM Store | balmsoothes.com
-        """
-        
-        return EmailService.send_email(
+        email = templates.render(
+            "password_reset",
+            reset_url=f"{settings.FRONTEND_URL}/reset-password?token={reset_token}",
+        )
+        return EmailService.queue_email(
             to_email=to_email,
-            subject="Reset Your Password - BALM Store",
-            html_content=html_content,
-            text_content=text_content
+            subject=email.subject,
+            html_content=email.html,
+            text_content=email.text,
+            dedupe_key=f"password-reset:{to_email}"
         )
     
     @staticmethod
     def send_verification_email(to_email: str, verification_token: str):
         """Send email verification email"""
-        verification_url = f"{settings.FRONTEND_URL}/verify-email?token={verification_token}"
-        
-        html_content = f"""
-        <html>
-            <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h2 style="color: #333;">Verify Your Email</h2>
-                <p>Welcome to BALM Store! Please verify your email address to complete your registration.</p>
-                <p style="margin: 30px 0;">
-                    <a href="{verification_url}" 
-                       style="background-color: #000; color: #fff; padding: 12px 30px; 
-                              text-decoration: none; border-radius: 5px; display: inline-block;">
-                        Verify Email
-                    </a>
-                </p>
-                <p style="color: #666; font-size: 14px;">
-                    This link will expire in 24 hours.
-                </p>
-                <hr style="border: none; border-top: 1px solid #ddd; margin: 30px 0;">
-                <p style="color: #999; font-size: 12px;">
-                    BALM Store | balmsoothes.com
-                </p>
-            </body>
-        </html>
-        """
-        
-        text_content = f"""
-        Verify Your Email
-        
-        Welcome to BALM Store! Please verify your email address to complete your registration.
-        
-        Click this link to verify your email:
-        {verification_url}
-        
-        This link will expire in 24 hours.
-        
-        BALM Store | balmsoothes.com
-        """
-        
-        return EmailService.send_email(
+        email = templates.render(
+            "verify_email",
+            verification_url=f"{settings.FRONTEND_URL}/verify-email?token={verification_token}",
+        )
+        return EmailService.queue_email(
             to_email=to_email,
-            subject="Verify Your Email - BALM Store",
-            html_content=html_content,
-            text_content=text_content
+            subject=email.subject,
+            html_content=email.html,
+            text_content=email.text,
+            dedupe_key=f"verify-email:{to_email}"
         )
     
     @staticmethod
     def send_welcome_email(to_email: str, name: str = None):
         """Send welcome email after successful registration"""
-        display_name = name or "there"
-        
-        html_content = f"""
-        <html>
-            <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h2 style="color: #333;">Welcome to BALM Store!</h2>
-                <p>Hi {display_name},</p>
-                <p>Thank you for joining BALM Store. We're excited to have you!</p>
-                <p style="margin: 30px 0;">
-                    <a href="{settings.FRONTEND_URL}" 
-                       style="background-color: #000; color: #fff; padding: 12px 30px; 
-                              text-decoration: none; border-radius: 5px; display: inline-block;">
-                        Start Shopping
-                    </a>
-                </p>
-                <hr style="border: none; border-top: 1px solid #ddd; margin: 30px 0;">
-                <p style="color: #999; font-size: 12px;">
-                    BALM Store | balmsoothes.com
-                </p>
-            </body>
-        </html>
-        """
-        
-        text_content = f"""
-        Welcome to BALM Store!
-        
-        Hi {display_name},
-        
-        Thank you for joining BALM Store. We're excited to have you!
-        
-        Visit us at: {settings.FRONTEND_URL}
-        
-        BALM Store | balmsoothes.com
-        """
-        
-        return EmailService.send_email(
+        email = templates.render("welcome", display_name=name or "there")
+        return EmailService.queue_email(
             to_email=to_email,
-            subject="Welcome to BALM Store!",
-            html_content=html_content,
-            text_content=text_content
+            subject=email.subject,
+            html_content=email.html,
+            text_content=email.text,
+            dedupe_key=f"welcome:{to_email}"
         )
 
 # Instance for easy import
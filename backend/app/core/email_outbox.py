@@ -0,0 +1,254 @@
+"""Transactional email outbox.
+
+Request handlers only insert rows into ``email_outbox``. A background task in
+each worker claims due rows, sends them through Resend's batch API with
+bounded concurrency, and retries failures with exponential backoff. Setting
+``RESEND_API_URL`` points the sender at a local fake Resend server.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+import resend
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import upstream_call
+from app.db.database import SessionLocal
+from app.models.email_outbox import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+# Resend accepts at most 100 messages per batch request
+RESEND_BATCH_LIMIT = 100
+# Rows stuck in "sending" this long (worker died mid-send) are claimed again
+CLAIM_TIMEOUT = timedelta(minutes=5)
+MAX_BACKOFF = timedelta(hours=1)
+
+
+def enqueue_email(
+    db: Session,
+    to_email: str,
+    subject: str,
+    html: str,
+    text: Optional[str] = None,
+    dedupe_key: Optional[str] = None,
+) -> EmailOutbox:
+    """Queue an email; a still-pending email with the same dedupe_key is replaced"""
+    row = None
+    if dedupe_key:
+        row = db.scalars(
+            select(EmailOutbox).where(
+                EmailOutbox.dedupe_key == dedupe_key, EmailOutbox.status == "pending"
+            )
+        ).first()
+
+    if row is None:
+        row = EmailOutbox(to_email=to_email, dedupe_key=dedupe_key, status="pending")
+        db.add(row)
+    row.subject = subject
+    row.html = html
+    row.text = text
+    row.next_attempt_at = datetime.utcnow()
+    db.commit()
+    return row
+
+
+def enqueue_many(db: Session, emails: list[dict]) -> None:
+    """Bulk-queue emails (to_email, subject, html, text, dedupe_key) in one INSERT.
+
+    Unlike enqueue_email this does not replace pending duplicates; bulk
+    senders dedupe at the source. The caller commits.
+    """
+    if not emails:
+        return
+    now = datetime.utcnow()
+    db.execute(
+        insert(EmailOutbox),
+        [{**email, "status": "pending", "attempts": 0, "next_attempt_at": now} for email in emails],
+    )
+
+
+def _backoff(attempts: int) -> timedelta:
+    delay = timedelta(seconds=settings.EMAIL_OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1))
+    return min(delay, MAX_BACKOFF)
+
+
+def claim_batch(db: Session, limit: int) -> list[EmailOutbox]:
+    """Mark up to ``limit`` due emails as sending and return them"""
+    now = datetime.utcnow()
+    candidates = db.scalars(
+        select(EmailOutbox)
+        .where(
+            or_(
+                (EmailOutbox.status == "pending") & (EmailOutbox.next_attempt_at <= now),
+                (EmailOutbox.status == "sending") & (EmailOutbox.claimed_at <= now - CLAIM_TIMEOUT),
+            )
+        )
+        .order_by(EmailOutbox.next_attempt_at)
+        .limit(limit)
+    ).all()
+
+    claimed = []
+    for row in candidates:
+        # Another worker may have claimed the row since the SELECT. A stale
+        # "sending" row stays "sending" when re-claimed, so claimed_at is
+        # what tells the competing re-claims apart.
+        result = db.execute(
+            update(EmailOutbox)
+            .where(
+                EmailOutbox.id == row.id,
+                EmailOutbox.status == row.status,
+                EmailOutbox.claimed_at == row.claimed_at,
+            )
+            .values(status="sending", claimed_at=now)
+        )
+        if result.rowcount:
+            claimed.append(row.id)
+    db.commit()
+    if not claimed:
+        return []
+    return list(db.scalars(select(EmailOutbox).where(EmailOutbox.id.in_(claimed))).all())
+
+
+def _params(row: EmailOutbox) -> dict:
+    params = {
+        "from": f"{settings.EMAIL_FROM_NAME} <{settings.EMAIL_FROM}>",
+        "to": [row.to_email],
+        "subject": row.subject,
+        "html": row.html,
+    }
+    if row.text:
+        params["text"] = row.text
+    return params
+
+
+def _retry_later(row: EmailOutbox, error: str, now: datetime) -> None:
+    row.attempts += 1
+    row.last_error = error
+    if row.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        row.status = "failed"
+        logger.error("Giving up on email %d to %s", row.id, row.to_email)
+    else:
+        row.status = "pending"
+        row.next_attempt_at = now + _backoff(row.attempts)
+
+
+def send_batch(ids: list[int]) -> None:
+    """Send claimed emails in one Resend batch request and record the outcome.
+
+    The batch is validated permissively, so Resend sends the valid messages
+    and reports the rejected ones by index. Rejected messages (bad or
+    suppressed addresses) would fail the same way again and are marked
+    failed; a failure of the whole request is retried with backoff.
+    """
+    db = SessionLocal()
+    try:
+        rows = list(db.scalars(select(EmailOutbox).where(EmailOutbox.id.in_(ids))).all())
+        if not rows:
+            return
+        resend.api_key = settings.RESEND_API_KEY
+        resend.api_url = settings.RESEND_API_URL
+        try:
+            with upstream_call("resend", "Batch.send"):
+                response = resend.Batch.send(
+                    [_params(row) for row in rows], {"batch_validation": "permissive"}
+                )
+        except Exception as e:
+            logger.warning("Email batch of %d failed: %s", len(rows), e)
+            now = datetime.utcnow()
+            for row in rows:
+                _retry_later(row, str(e), now)
+            db.commit()
+            return
+
+        response = response or {}
+        rejected = {}
+        for error in response.get("errors") or []:
+            try:
+                rejected[int(error["index"])] = str(error.get("message") or "Rejected by Resend")
+            except (KeyError, TypeError, ValueError):
+                logger.warning("Ignoring malformed batch error: %r", error)
+        # Ids are returned for the accepted messages only, in request order
+        sent = iter(response.get("data") or [])
+        now = datetime.utcnow()
+        for position, row in enumerate(rows):
+            row.attempts += 1
+            if position in rejected:
+                row.status = "failed"
+                row.last_error = rejected[position]
+                logger.error("Resend rejected email %d to %s: %s", row.id, row.to_email, row.last_error)
+                continue
+            row.status = "sent"
+            row.sent_at = now
+            row.last_error = None
+            row.provider_id = (next(sent, None) or {}).get("id")
+        db.commit()
+        logger.info("Sent %d emails", len(rows) - len(rejected))
+    finally:
+        db.close()
+
+
+class OutboxSender:
+    """Background loop draining the outbox; one per worker"""
+
+    def __init__(self):
+        self._stopping: Optional[asyncio.Event] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight: set[asyncio.Task] = set()
+
+    def _claim(self) -> list[list[int]]:
+        db = SessionLocal()
+        try:
+            limit = settings.EMAIL_OUTBOX_BATCH_SIZE * settings.EMAIL_OUTBOX_CONCURRENCY
+            ids = [row.id for row in claim_batch(db, limit)]
+        finally:
+            db.close()
+        size = min(settings.EMAIL_OUTBOX_BATCH_SIZE, RESEND_BATCH_LIMIT)
+        return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+    async def _send(self, ids: list[int]) -> None:
+        async with self._semaphore:
+            await asyncio.to_thread(send_batch, ids)
+
+    async def run(self) -> None:
+        # Created here so they bind to the running event loop
+        self._stopping = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(settings.EMAIL_OUTBOX_CONCURRENCY)
+        if not settings.RESEND_API_KEY:
+            logger.warning("Email outbox sender disabled (Resend not configured)")
+            return
+
+        while not self._stopping.is_set():
+            try:
+                batches = await asyncio.to_thread(self._claim)
+            except Exception:
+                logger.exception("Failed to claim email outbox rows")
+                batches = []
+
+            for ids in batches:
+                task = asyncio.create_task(self._send(ids))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+
+            if self._in_flight:
+                await asyncio.wait(set(self._in_flight))
+            if not batches:
+                try:
+                    await asyncio.wait_for(
+                        self._stopping.wait(), timeout=settings.EMAIL_OUTBOX_POLL_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+    async def stop(self) -> None:
+        """Stop claiming new emails and wait for batches already being sent"""
+        if self._stopping is not None:
+            self._stopping.set()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+
+outbox_sender = OutboxSender()
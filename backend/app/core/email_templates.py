@@ -0,0 +1,242 @@
+"""Precompiled email templates.
+
+Every template shares one HTML layout. At import time each template is
+compiled into alternating static segments and field names. Settings such
+as FRONTEND_URL are folded into the static segments, so rendering only
+escapes and joins the per-recipient fields. The plain-text part is derived
+from the HTML once, at compile time, and compiled the same way.
+"""
+import html
+import re
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from string import Formatter
+from typing import Any, Callable, Optional
+
+from app.core.config import settings
+
+LAYOUT = """<html>
+    <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
+        <h2 style="color: #333;">{heading}</h2>
+        {body}
+        <hr style="border: none; border-top: 1px solid #ddd; margin: 30px 0;">
+        <p style="color: #999; font-size: 12px;">
+            BALM Store | balmsoothes.com
+        </p>
+    </body>
+</html>"""
+
+BUTTON = """<p style="margin: 30px 0;">
+            <a href="{{{url_field}}}"
+               style="background-color: #000; color: #fff; padding: 12px 30px;
+                      text-decoration: none; border-radius: 5px; display: inline-block;">
+                {label}
+            </a>
+        </p>"""
+
+NOTE = """<p style="color: #666; font-size: 14px;">
+            {text}
+        </p>"""
+
+
+@dataclass(frozen=True)
+class RenderedEmail:
+    subject: str
+    html: str
+    text: str
+
+
+class _TextExtractor(HTMLParser):
+    """Turn template HTML into plain text, keeping {field} placeholders"""
+
+    BLOCK_TAGS = {"p", "h1", "h2", "h3", "div", "br", "hr", "li", "tr"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: list[str] = []
+        self._current: list[str] = []
+        self._href: Optional[str] = None
+
+    def _flush(self) -> None:
+        line = re.sub(r"\s+", " ", "".join(self._current)).strip()
+        if line:
+            self.blocks.append(line)
+        self._current = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.BLOCK_TAGS:
+            self._flush()
+        if tag == "a":
+            self._href = dict(attrs).get("href")
+
+    def handle_endtag(self, tag):
+        if tag == "a" and self._href:
+            self._current = ["".join(self._current).rstrip(), f": {self._href}"]
+            self._href = None
+        if tag in self.BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        self._current.append(data)
+
+    def text(self) -> str:
+        self._flush()
+        return "\n\n".join(self.blocks)
+
+
+def html_to_text(source: str) -> str:
+    parser = _TextExtractor()
+    parser.feed(source)
+    parser.close()
+    return parser.text()
+
+
+class _Compiled:
+    """A template split into static segments around its variable fields"""
+
+    def __init__(self, source: str, constants: dict[str, Any], escape: Callable[[str], str]):
+        statics: list[str] = []
+        fields: list[str] = []
+        buffer: list[str] = []
+        for literal, field, _spec, _conversion in Formatter().parse(source):
+            buffer.append(literal)
+            if field is None:
+                continue
+            if field in constants:
+                buffer.append(escape(str(constants[field])))
+                continue
+            statics.append("".join(buffer))
+            fields.append(field)
+            buffer = []
+        statics.append("".join(buffer))
+
+        self.head = statics[0]
+        self.parts = tuple(zip(fields, statics[1:]))
+        self.fields = frozenset(fields)
+        self._escape = escape
+
+    def render(self, values: dict[str, Any]) -> str:
+        escape = self._escape
+        out = [self.head]
+        for field, static in self.parts:
+            out.append(escape(str(values[field])))
+            out.append(static)
+        return "".join(out)
+
+
+def _escape_html(value: str) -> str:
+    return html.escape(value, quote=True)
+
+
+def _no_escape(value: str) -> str:
+    return value
+
+
+class EmailTemplate:
+    def __init__(self, name: str, subject: str, html_source: str, constants: dict[str, Any]):
+        self.name = name
+        self._subject = _Compiled(subject, constants, _no_escape)
+        self._html = _Compiled(html_source, constants, _escape_html)
+        self._text = _Compiled(html_to_text(html_source), constants, _no_escape)
+        self.fields = self._subject.fields | self._html.fields | self._text.fields
+
+    def render(self, **values: Any) -> RenderedEmail:
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"Template {self.name} is missing fields: {sorted(missing)}")
+        return RenderedEmail(
+            subject=self._subject.render(values),
+            html=self._html.render(values),
+            text=self._text.render(values),
+        )
+
+
+class TemplateEngine:
+    """Registry of compiled templates sharing the layout"""
+
+    def __init__(self, constants: dict[str, Any]):
+        self.constants = constants
+        self._templates: dict[str, EmailTemplate] = {}
+
+    def register(
+        self,
+        name: str,
+        subject: str,
+        heading: str,
+        paragraphs: list[str],
+        button: Optional[tuple[str, str]] = None,
+        notes: tuple[str, ...] = (),
+    ) -> EmailTemplate:
+        """Compile a template; ``button`` is (label, url field name)"""
+        body = [f"<p>{paragraph}</p>" for paragraph in paragraphs]
+        if button:
+            label, url_field = button
+            body.append(BUTTON.format(label=label, url_field=url_field))
+        body.extend(NOTE.format(text=note) for note in notes)
+        source = LAYOUT.replace("{heading}", heading).replace(
+            "{body}", "\n        ".join(body)
+        )
+        template = EmailTemplate(name, subject, source, self.constants)
+        self._templates[name] = template
+        return template
+
+    def render(self, name: str, **values: Any) -> RenderedEmail:
+        return self._templates[name].render(**values)
+
+
+templates = TemplateEngine(
+    constants={
+        "frontend_url": settings.FRONTEND_URL,
+        "reset_expire_minutes": settings.PASSWORD_RESET_TOKEN_EXPIRE_MINUTES,
+        "verify_expire_hours": settings.EMAIL_VERIFICATION_TOKEN_EXPIRE_MINUTES // 60,
+    }
+)
+
+templates.register(
+    "password_reset",
+    subject="Reset Your Password - BALM Store",
+    heading="Reset Your Password",
+    paragraphs=[
+        "You requested to reset your password for your BALM Store account.",
+        "Click the button below to reset your password:",
+    ],
+    button=("Reset Password", "reset_url"),
+    notes=(
+        "This link will expire in {reset_expire_minutes} minutes.",
+        "If you didn't request this, you can safely ignore this email.",
+    ),
+)
+
+templates.register(
+    "verify_email",
+    subject="Verify Your Email - BALM Store",
+    heading="Verify Your Email",
+    paragraphs=[
+        "Welcome to BALM Store! Please verify your email address to complete your registration.",
+    ],
+    button=("Verify Email", "verification_url"),
+    notes=("This link will expire in {verify_expire_hours} hours.",),
+)
+
+templates.register(
+    "welcome",
+    subject="Welcome to BALM Store!",
+    heading="Welcome to BALM Store!",
+    paragraphs=[
+        "Hi {display_name},",
+        "Thank you for joining BALM Store. We're excited to have you!",
+    ],
+    button=("Start Shopping", "frontend_url"),
+)
+
+templates.register(
+    "restock",
+    subject="Back in stock: {product_name} ({size})",
+    heading="It's back!",
+    paragraphs=[
+        "{product_name} in size {size} is back in stock at BALM Store.",
+        "Quantities are limited, so grab yours while it lasts.",
+    ],
+    button=("Shop Now", "product_url"),
+    notes=("You're receiving this because you asked to be notified when this item returned.",),
+)
@@ -0,0 +1,71 @@
+"""Collapse duplicate submissions of the same request.
+
+Results are kept in the shared cache backend for a short window, so repeats
+from any worker get the stored result. Identical requests that arrive while
+the first one is still running in this worker wait for it and share its
+result instead of making their own upstream call.
+"""
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Optional
+
+from app.core.cache import CacheBackend
+
+
+def idempotency_key(*parts: Any) -> str:
+    """Stable hash of JSON-serializable request parts"""
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
+
+class IdempotentCalls:
+    """Run ``fn`` once per key within ``ttl`` seconds"""
+
+    def __init__(self, backend: CacheBackend, prefix: str, ttl: int):
+        self.backend = backend
+        self.prefix = prefix
+        self.ttl = ttl
+        self._flights: dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def stored(self, key: str) -> Optional[str]:
+        """Result already stored for ``key`` by any worker, if any"""
+        return self.backend.get(f"{self.prefix}:{key}")
+
+    def run(self, key: str, fn: Callable[[], str]) -> str:
+        cache_key = f"{self.prefix}:{key}"
+        cached = self.backend.get(cache_key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            self.backend.set(cache_key, flight.result, ttl=self.ttl)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
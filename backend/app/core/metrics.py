@@ -0,0 +1,223 @@
+"""In-process metrics exported in the Prometheus text format.
+
+Metrics are per worker process; with several workers each scrape sees the
+worker that answered it, so scrape every worker or sum in Prometheus.
+Recording is a dict lookup, a bisect and a few additions under an
+uncontended lock, which keeps per-request overhead in the low microseconds
+(see scripts/bench_metrics_overhead.py).
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from app.core import tracing
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = tuple[str, ...]
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            snapshot = dict(self._values)
+        for values, value in sorted(snapshot.items()):
+            yield f"{self.name}{_format_labels(self.labels, values)} {value}"
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        callback: Optional[Callable[[], dict[LabelValues, float]]] = None,
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[LabelValues, float] = {}
+        self._callback = callback
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def dec(self, *label_values: str, amount: float = 1.0) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            self._values[label_values] = value
+
+    def samples(self) -> Iterator[str]:
+        if self._callback:
+            values = self._callback()
+        else:
+            # Copied so a concurrent set() can't resize the dict mid-scrape
+            with self._lock:
+                values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series: dict[LabelValues, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *label_values: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            cumulative += series[len(self.buckets)]
+            labels = _format_labels(self.labels, label_values, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {cumulative}"
+            plain = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{plain} {series[-1]}"
+            yield f"{self.name}_count{plain} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.register(Histogram(
+    "balm_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    labels=("method", "route", "status"),
+))
+REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    "balm_http_requests_in_flight",
+    "HTTP requests currently being served",
+))
+UPSTREAM_LATENCY = registry.register(Histogram(
+    "balm_upstream_call_duration_seconds",
+    "Outbound Stripe/Google/Resend call latency",
+    labels=("service", "operation", "outcome"),
+))
+CACHE_REQUESTS = registry.register(Counter(
+    "balm_cache_requests_total",
+    "Cache lookups by result",
+    labels=("cache", "result"),
+))
+
+
+@contextmanager
+def upstream_call(service: str, operation: str) -> Iterator[None]:
+    """Time an outbound call, e.g. ``with upstream_call("stripe", "Product.list")``"""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - started
+        UPSTREAM_LATENCY.observe(elapsed, service, operation, outcome)
+        tracing.record(service, elapsed)
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware recording latency per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec()
+            # FastAPI records the matched route; static mounts don't have one
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "other"
+            REQUEST_LATENCY.observe(elapsed, scope["method"], path, f"{status[0] // 100}xx")
@@ -0,0 +1,206 @@
+"""Orders recorded from completed checkout sessions, with daily rollups.
+
+Each order also adds its line items to ``daily_sales`` in the same
+transaction, so reporting reads the small rollup table rather than scanning
+every order item.
+
+Stripe stock is decremented per line after the order is stored. Each line is
+claimed (``inventory_applied``) before its decrement and released again if the
+decrement fails, so a redelivered webhook retries exactly the lines that are
+still missing and concurrent deliveries never apply one twice.
+"""
+import logging
+import re
+from datetime import date, datetime, timezone
+from typing import Any, Optional
+
+import stripe
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.metrics import upstream_call
+from app.models.order import DailySales, Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+_ITEM_KEY_RE = re.compile(r"^item_(\d+)_(.+)$")
+
+
+def _sizes_by_position(metadata: dict[str, str]) -> dict[int, str]:
+    sizes: dict[int, str] = {}
+    for key, value in metadata.items():
+        m = _ITEM_KEY_RE.match(key)
+        if m and m.group(2) == "size":
+            sizes[int(m.group(1))] = value
+    return sizes
+
+
+def _add_to_rollup(db: Session, day: date, item: OrderItem) -> None:
+    insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(DailySales).values(
+        day=day,
+        product_id=item.product_id,
+        size=item.size,
+        quantity=item.quantity,
+        revenue=item.amount,
+        orders=1,
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["day", "product_id", "size"],
+            set_={
+                "quantity": DailySales.quantity + stmt.excluded.quantity,
+                "revenue": DailySales.revenue + stmt.excluded.revenue,
+                "orders": DailySales.orders + 1,
+            },
+        )
+    )
+
+
+def record_order(db: Session, session: Any, completed_at: Optional[int] = None) -> Optional[Order]:
+    """Persist a completed session; returns None if it was already recorded.
+
+    ``completed_at`` is the Unix time of the checkout.session.completed event.
+    Orders and rollups are dated by it rather than by the session's creation,
+    which can fall on the previous day.
+    """
+    session_id = session["id"]
+    if db.scalar(select(Order.id).where(Order.stripe_session_id == session_id)):
+        return None
+
+    # Line items are in cart order, which is also the item_<n>_* metadata order
+    with upstream_call("stripe", "checkout.Session.list_line_items"):
+        line_items = list(
+            stripe.checkout.Session.list_line_items(
+                session_id, limit=100, expand=["data.price"]
+            ).auto_paging_iter()
+        )
+    sizes = _sizes_by_position(session.get("metadata") or {})
+    if completed_at:
+        placed_at = datetime.fromtimestamp(completed_at, tz=timezone.utc).replace(tzinfo=None)
+    else:
+        placed_at = datetime.utcnow()
+
+    customer = session.get("customer_details") or {}
+    order = Order(
+        stripe_session_id=session_id,
+        customer_email=customer.get("email") or session.get("customer_email"),
+        amount_total=session.get("amount_total") or 0,
+        currency=session.get("currency") or "usd",
+        placed_at=placed_at,
+    )
+    for position, line in enumerate(line_items):
+        price = line.get("price") or {}
+        product = price.get("product")
+        order.items.append(OrderItem(
+            product_id=product if isinstance(product, str) else (product or {}).get("id", ""),
+            size=sizes.get(position, ""),
+            quantity=line.get("quantity") or 0,
+            amount=line.get("amount_total") or 0,
+        ))
+
+    db.add(order)
+    try:
+        db.flush()
+        for item in order.items:
+            _add_to_rollup(db, placed_at.date(), item)
+        db.commit()
+    except IntegrityError:
+        # A concurrent delivery of the same event got there first
+        db.rollback()
+        return None
+
+    logger.info("Recorded order %s (%d items)", session_id, len(order.items))
+    return order
+
+
+def unapplied_stock_items(db: Session, session_id: str) -> list[OrderItem]:
+    """Sized lines of a recorded order whose Stripe stock hasn't been decremented"""
+    return list(db.scalars(
+        select(OrderItem)
+        .join(Order)
+        .where(
+            Order.stripe_session_id == session_id,
+            OrderItem.inventory_applied.is_(False),
+            OrderItem.product_id != "",
+            OrderItem.size != "",
+        )
+        .order_by(OrderItem.id)
+    ))
+
+
+def claim_stock_item(db: Session, item_id: int) -> bool:
+    """Mark a line as applied; False if another delivery already claimed it"""
+    claimed = db.execute(
+        update(OrderItem)
+        .where(OrderItem.id == item_id, OrderItem.inventory_applied.is_(False))
+        .values(inventory_applied=True)
+    ).rowcount
+    db.commit()
+    return claimed == 1
+
+
+def release_stock_item(db: Session, item_id: int) -> None:
+    """Undo a claim whose decrement failed, so the next delivery retries it"""
+    db.rollback()
+    db.execute(update(OrderItem).where(OrderItem.id == item_id).values(inventory_applied=False))
+    db.commit()
+
+
+def sales_by_day(db: Session, start: date, end: date) -> list[dict[str, Any]]:
+    rows = db.execute(
+        select(
+            DailySales.day,
+            func.sum(DailySales.quantity),
+            func.sum(DailySales.revenue),
+        )
+        .where(DailySales.day.between(start, end))
+        .group_by(DailySales.day)
+        .order_by(DailySales.day)
+    ).all()
+    return [
+        {"day": day.isoformat(), "quantity": quantity, "revenue": revenue / 100}
+        for day, quantity, revenue in rows
+    ]
+
+
+def sales_by_product(db: Session, start: date, end: date) -> list[dict[str, Any]]:
+    rows = db.execute(
+        select(
+            DailySales.product_id,
+            func.sum(DailySales.quantity),
+            func.sum(DailySales.revenue),
+        )
+        .where(DailySales.day.between(start, end))
+        .group_by(DailySales.product_id)
+        .order_by(func.sum(DailySales.revenue).desc())
+    ).all()
+    return [
+        {"productId": product_id, "quantity": quantity, "revenue": revenue / 100}
+        for product_id, quantity, revenue in rows
+    ]
+
+
+def sales_by_size(
+    db: Session, start: date, end: date, product_id: Optional[str] = None
+) -> list[dict[str, Any]]:
+    query = (
+        select(
+            DailySales.product_id,
+            DailySales.size,
+            func.sum(DailySales.quantity),
+            func.sum(DailySales.revenue),
+        )
+        .where(DailySales.day.between(start, end))
+        .group_by(DailySales.product_id, DailySales.size)
+        .order_by(DailySales.product_id, DailySales.size)
+    )
+    if product_id:
+        query = query.where(DailySales.product_id == product_id)
+    return [
+        {"productId": pid, "size": size, "quantity": quantity, "revenue": revenue / 100}
+        for pid, size, quantity, revenue in db.execute(query).all()
+    ]
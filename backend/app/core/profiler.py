@@ -0,0 +1,52 @@
+"""On-demand sampling profiler for a running worker.
+
+A background thread snapshots every other thread's Python stack with
+``sys._current_frames()`` at a fixed interval. The samples are aggregated
+into the collapsed-stack format (``frame;frame;frame count``) that
+flamegraph.pl and speedscope read. Nothing runs unless a profile is being
+taken, and only one profile runs per worker at a time.
+"""
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+
+MAX_SECONDS = 60
+_lock = threading.Lock()
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a profile is already running in this worker"""
+
+
+def _collapse(frame: FrameType) -> str:
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+def sample(seconds: float, interval: float = 0.005) -> str:
+    """Sample all threads for ``seconds`` and return collapsed stacks"""
+    if not _lock.acquire(blocking=False):
+        raise ProfilerBusyError("A profile is already running in this worker")
+    try:
+        seconds = min(seconds, MAX_SECONDS)
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks: Counter[str] = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                thread = names.get(thread_id) or f"thread-{thread_id}"
+                stacks[f"{thread};{_collapse(frame)}"] += 1
+            time.sleep(interval)
+    finally:
+        _lock.release()
+
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
@@ -0,0 +1,182 @@
+"""Rate limits for the password and restock sign-up endpoints.
+
+Login, token and register each hash a password with bcrypt, which costs tens
+of milliseconds of CPU. A credential-stuffing burst could otherwise occupy
+every worker. Restock sign-ups need no account but lead to email being sent
+to the given address, so they are limited the same way. Each attempt is checked against token buckets keyed by client
+IP and by email before any hashing happens. Rejections are cheap: one dict
+lookup and a little arithmetic under a per-shard lock.
+
+Buckets live in this process by default, so with several workers each worker
+enforces its own share. With ``RATE_LIMIT_SHARED`` the counts go through the
+shared cache backend (``CACHE_URL``) instead, as fixed windows of
+``burst / rate`` seconds that allow the same long-run rate.
+"""
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import HTTPException, Request, status
+
+from app.core.cache import CacheBackend, shared_backend
+from app.core.config import settings
+from app.core.metrics import Counter, registry
+
+RATE_LIMITED = registry.register(Counter(
+    "balm_rate_limited_total",
+    "Requests rejected by a rate limit",
+    labels=("limit",),
+))
+
+
+@dataclass(frozen=True)
+class Limit:
+    name: str
+    # Attempts allowed at once, refilled at ``per_minute``
+    burst: int
+    per_minute: float
+
+    @property
+    def rate(self) -> float:
+        return self.per_minute / 60
+
+    @property
+    def window(self) -> float:
+        """Seconds for an empty bucket to refill completely"""
+        return self.burst / self.rate
+
+
+class _Shard:
+    __slots__ = ("lock", "buckets", "next_sweep")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> (tokens, updated_at, full_at)
+        self.buckets: dict[tuple[str, str], tuple[float, float, float]] = {}
+        self.next_sweep = 0.0
+
+
+class BucketStore:
+    """Token buckets in sharded dicts.
+
+    Buckets are never refilled by a timer. They are topped up when next
+    touched, and a bucket that would be full again is indistinguishable
+    from a missing one, so each shard drops those lazily.
+    """
+
+    SHARDS = 32
+    SWEEP_INTERVAL = 60.0
+
+    def __init__(self):
+        self._shards = [_Shard() for _ in range(self.SHARDS)]
+
+    def hit(self, limit: Limit, key: str, now: Optional[float] = None) -> Optional[float]:
+        """Take a token; returns None if allowed, else seconds until one is free"""
+        now = time.monotonic() if now is None else now
+        bucket_key = (limit.name, key)
+        shard = self._shards[hash(bucket_key) % self.SHARDS]
+        with shard.lock:
+            if now >= shard.next_sweep:
+                self._sweep(shard, now)
+            bucket = shard.buckets.get(bucket_key)
+            if bucket is None:
+                tokens = float(limit.burst)
+            else:
+                tokens = min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            full_at = now + (limit.burst - tokens) / limit.rate
+            shard.buckets[bucket_key] = (tokens, now, full_at)
+        return None if allowed else (1 - tokens) / limit.rate
+
+    def _sweep(self, shard: _Shard, now: float) -> None:
+        stale = [key for key, bucket in shard.buckets.items() if bucket[2] <= now]
+        for key in stale:
+            del shard.buckets[key]
+        shard.next_sweep = now + self.SWEEP_INTERVAL
+
+    def __len__(self) -> int:
+        return sum(len(shard.buckets) for shard in self._shards)
+
+
+class SharedWindowStore:
+    """Fixed-window counters in the shared cache backend, for multi-worker deployments"""
+
+    def __init__(self, backend: CacheBackend, prefix: str = "balm:ratelimit"):
+        self._backend = backend
+        self._prefix = prefix
+
+    def hit(self, limit: Limit, key: str, now: Optional[float] = None) -> Optional[float]:
+        now = time.time() if now is None else now
+        window = max(1, math.ceil(limit.window))
+        slot = int(now // window)
+        count = self._backend.incr(f"{self._prefix}:{limit.name}:{key}:{slot}", ttl=window + 1)
+        if count > limit.burst:
+            return (slot + 1) * window - now
+        return None
+
+
+LOGIN_PER_IP = Limit("login_ip", settings.AUTH_RATE_LIMIT_IP_BURST, settings.AUTH_RATE_LIMIT_IP_PER_MINUTE)
+LOGIN_PER_EMAIL = Limit(
+    "login_email", settings.AUTH_RATE_LIMIT_EMAIL_BURST, settings.AUTH_RATE_LIMIT_EMAIL_PER_MINUTE
+)
+REGISTER_PER_IP = Limit(
+    "register_ip", settings.REGISTER_RATE_LIMIT_IP_BURST, settings.REGISTER_RATE_LIMIT_IP_PER_MINUTE
+)
+RESTOCK_PER_IP = Limit(
+    "restock_ip", settings.RESTOCK_RATE_LIMIT_IP_BURST, settings.RESTOCK_RATE_LIMIT_IP_PER_MINUTE
+)
+RESTOCK_PER_EMAIL = Limit(
+    "restock_email", settings.RESTOCK_RATE_LIMIT_EMAIL_BURST, settings.RESTOCK_RATE_LIMIT_EMAIL_PER_MINUTE
+)
+
+store = SharedWindowStore(shared_backend) if settings.RATE_LIMIT_SHARED else BucketStore()
+
+
+def client_ip(request: Request) -> str:
+    """The caller's address, read from X-Forwarded-For behind RATE_LIMIT_PROXY_HOPS proxies"""
+    hops = settings.RATE_LIMIT_PROXY_HOPS
+    if hops:
+        forwarded = [part.strip() for part in request.headers.get("x-forwarded-for", "").split(",") if part.strip()]
+        if len(forwarded) >= hops:
+            # Each trusted proxy appends the address it saw; earlier entries can be forged
+            return forwarded[-hops]
+    return request.client.host if request.client else "unknown"
+
+
+def enforce(*checks: tuple[Limit, Optional[str]]) -> None:
+    """Raise 429 with Retry-After if any (limit, key) is exhausted; None keys are skipped"""
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    for limit, key in checks:
+        if not key:
+            continue
+        retry_after = store.hit(limit, key)
+        if retry_after is not None:
+            RATE_LIMITED.inc(limit.name)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many attempts. Please wait and try again.",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+
+def enforce_login(request: Request, email: Optional[str]) -> None:
+    enforce(
+        (LOGIN_PER_IP, client_ip(request)),
+        (LOGIN_PER_EMAIL, email.strip().lower() if email else None),
+    )
+
+
+def enforce_register(request: Request) -> None:
+    enforce((REGISTER_PER_IP, client_ip(request)))
+
+
+def enforce_restock(request: Request, email: str) -> None:
+    enforce(
+        (RESTOCK_PER_IP, client_ip(request)),
+        (RESTOCK_PER_EMAIL, email.strip().lower()),
+    )
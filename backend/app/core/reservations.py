@@ -0,0 +1,172 @@
+"""Stock reservations held while a shopper is on Stripe Checkout.
+
+A hold is taken when the checkout session is created and released when the
+session completes or expires. Holds that are never released (lost webhooks,
+abandoned sessions) run out at ``expires_at``. Expiry is driven by the index
+on ``stock_holds.expires_at``, so each sweep only touches holds that are due.
+
+Holds are checked against the stock in the cached catalog (see "Shared
+cache" in docs/DEPLOYMENT.md).
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.models.reservation import CheckoutSessionHold, StockHold, StockHoldTotal
+
+logger = logging.getLogger(__name__)
+
+StockKey = tuple[str, str]  # (product_id, size)
+
+# Stripe sessions live at most this long, so their claims can go after it
+SESSION_CLAIM_LIFETIME = timedelta(hours=24)
+
+
+class OutOfStockError(Exception):
+    """Raised when a cart asks for more units than are available"""
+
+    def __init__(self, unavailable: list[StockKey]):
+        super().__init__(", ".join(f"{p} ({s})" for p, s in unavailable))
+        self.unavailable = unavailable
+
+
+def _insert(db: Session):
+    return pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+
+
+def _ensure_totals(db: Session, keys: Iterable[StockKey]) -> None:
+    rows = [{"product_id": p, "size": s, "held": 0} for p, s in keys]
+    if not rows:
+        return
+    db.execute(_insert(db)(StockHoldTotal).values(rows).on_conflict_do_nothing())
+
+
+def _release_rows(db: Session, holds: list[StockHold]) -> None:
+    for hold in holds:
+        # Only the worker whose DELETE wins gives the units back
+        deleted = db.execute(delete(StockHold).where(StockHold.id == hold.id)).rowcount
+        if deleted:
+            db.execute(
+                update(StockHoldTotal)
+                .where(
+                    StockHoldTotal.product_id == hold.product_id,
+                    StockHoldTotal.size == hold.size,
+                )
+                .values(held=StockHoldTotal.held - hold.quantity)
+            )
+
+
+def expire_holds(db: Session, now: datetime | None = None) -> int:
+    """Release holds past their expiry (caller commits); returns the count"""
+    now = now or datetime.utcnow()
+    due = db.scalars(select(StockHold).where(StockHold.expires_at <= now)).all()
+    _release_rows(db, list(due))
+    db.execute(
+        delete(CheckoutSessionHold).where(
+            CheckoutSessionHold.created_at <= now - SESSION_CLAIM_LIFETIME
+        )
+    )
+    return len(due)
+
+
+def reserve(
+    db: Session,
+    hold_id: str,
+    requested: dict[StockKey, int],
+    stock: dict[StockKey, int],
+    ttl: timedelta,
+) -> None:
+    """Atomically hold ``requested`` units against ``stock``.
+
+    Keys missing from ``stock`` are not inventory-tracked and are not held.
+    Raises OutOfStockError (and holds nothing) if any key falls short.
+    """
+    tracked = {key: qty for key, qty in requested.items() if key in stock}
+    if not tracked:
+        return
+
+    expire_holds(db)
+    db.commit()
+    _ensure_totals(db, tracked)
+
+    unavailable: list[StockKey] = []
+    # Sorted so concurrent carts lock the rows in the same order
+    for key in sorted(tracked):
+        quantity = tracked[key]
+        product_id, size = key
+        result = db.execute(
+            update(StockHoldTotal)
+            .where(
+                StockHoldTotal.product_id == product_id,
+                StockHoldTotal.size == size,
+                StockHoldTotal.held + quantity <= stock[key],
+            )
+            .values(held=StockHoldTotal.held + quantity)
+        )
+        if result.rowcount != 1:
+            unavailable.append(key)
+
+    if unavailable:
+        db.rollback()
+        raise OutOfStockError(unavailable)
+
+    expires_at = datetime.utcnow() + ttl
+    db.add_all(
+        StockHold(
+            hold_id=hold_id,
+            product_id=product_id,
+            size=size,
+            quantity=quantity,
+            expires_at=expires_at,
+        )
+        for (product_id, size), quantity in tracked.items()
+    )
+    db.commit()
+
+
+def attach_session(db: Session, hold_id: str, session_id: str) -> None:
+    """Bind a provisional hold to the Stripe session it was created for.
+
+    If the session already has a hold (an idempotent replay of a session
+    another request opened), the new hold is released instead. The claim is
+    a single INSERT on the session's primary key, so when replays race only
+    one of them wins.
+    """
+    claimed = db.execute(
+        _insert(db)(CheckoutSessionHold)
+        .values(session_id=session_id, hold_id=hold_id, created_at=datetime.utcnow())
+        .on_conflict_do_nothing()
+    ).rowcount
+    if not claimed:
+        owner = db.scalar(
+            select(CheckoutSessionHold.hold_id).where(CheckoutSessionHold.session_id == session_id)
+        )
+        if owner != hold_id:
+            release_hold(db, hold_id)
+            return
+    db.execute(
+        update(StockHold).where(StockHold.hold_id == hold_id).values(session_id=session_id)
+    )
+    db.commit()
+
+
+def release_hold(db: Session, hold_id: str) -> None:
+    """Release a hold whose checkout session was never created"""
+    holds = db.scalars(select(StockHold).where(StockHold.hold_id == hold_id)).all()
+    _release_rows(db, list(holds))
+    db.commit()
+
+
+def release_session(db: Session, session_id: str) -> int:
+    """Release the hold for a completed or expired checkout session"""
+    holds = db.scalars(select(StockHold).where(StockHold.session_id == session_id)).all()
+    _release_rows(db, list(holds))
+    db.commit()
+    if holds:
+        logger.info("Released %d stock holds for session %s", len(holds), session_id)
+    return len(holds)
@@ -0,0 +1,130 @@
+"""Restock notification fan-out.
+
+When a (product, size) goes from 0 to in stock, pending subscribers are read
+in fixed-size pages by id, rendered through the email templates and bulk
+inserted into the email outbox. Each page is committed before the next is
+read, so memory stays bounded by RESTOCK_CHUNK_SIZE however many people
+subscribed. The outbox sender does the actual sending in the background with
+its own bounded concurrency.
+"""
+import logging
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.email_outbox import enqueue_many
+from app.core.email_templates import templates
+from app.db.database import SessionLocal
+from app.models.restock import RestockSubscription
+
+logger = logging.getLogger(__name__)
+
+
+def subscribe(db: Session, product_id: str, size: str, email: str) -> None:
+    """Subscribe an email to a restock; re-subscribing re-arms it"""
+    subscription = db.scalars(
+        select(RestockSubscription).where(
+            RestockSubscription.product_id == product_id,
+            RestockSubscription.size == size,
+            RestockSubscription.email == email,
+        )
+    ).first()
+    if subscription is None:
+        db.add(RestockSubscription(product_id=product_id, size=size, email=email))
+    else:
+        subscription.notified_at = None
+    db.commit()
+
+
+def _stock(value: Any) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def restocked_sizes(metadata: dict[str, Any], previous_metadata: dict[str, Any]) -> list[str]:
+    """Sizes whose stock_<size> went from 0 (or unset) to above 0"""
+    sizes = []
+    for key, old_value in previous_metadata.items():
+        if key.startswith("stock_") and _stock(old_value) <= 0 < _stock(metadata.get(key)):
+            sizes.append(key[len("stock_"):])
+    return sizes
+
+
+def stock_changes(
+    metadata: dict[str, Any], previous_metadata: dict[str, Any]
+) -> list[tuple[str, int, int]]:
+    """(size, new stock, delta) for every stock_<size> that changed"""
+    changes = []
+    for key, old_value in previous_metadata.items():
+        if not key.startswith("stock_"):
+            continue
+        stock = _stock(metadata.get(key))
+        delta = stock - _stock(old_value)
+        if delta:
+            changes.append((key[len("stock_"):], stock, delta))
+    return changes
+
+
+def notify_restock(product_id: str, product_name: str, size: str) -> int:
+    """Queue restock emails for every pending subscriber; returns the count"""
+    if not settings.RESEND_API_KEY:
+        logger.warning("Restock emails not queued (Resend not configured): %s %s", product_id, size)
+        return 0
+
+    chunk_size = settings.RESTOCK_CHUNK_SIZE
+    # Nothing in the email is per-recipient, so it is rendered once
+    rendered = templates.render(
+        "restock",
+        product_name=product_name,
+        size=size,
+        product_url=f"{settings.FRONTEND_URL}/product/{product_id}",
+    )
+    queued = 0
+    last_id = 0
+    db = SessionLocal()
+    try:
+        while True:
+            page = db.execute(
+                select(RestockSubscription.id, RestockSubscription.email)
+                .where(
+                    RestockSubscription.product_id == product_id,
+                    RestockSubscription.size == size,
+                    RestockSubscription.notified_at.is_(None),
+                    RestockSubscription.id > last_id,
+                )
+                .order_by(RestockSubscription.id)
+                .limit(chunk_size)
+            ).all()
+            if not page:
+                break
+
+            enqueue_many(db, [
+                {
+                    "to_email": email,
+                    "subject": rendered.subject,
+                    "html": rendered.html,
+                    "text": rendered.text,
+                    "dedupe_key": f"restock:{product_id}:{size}:{email}",
+                }
+                for _, email in page
+            ])
+            ids = [subscription_id for subscription_id, _ in page]
+            db.execute(
+                update(RestockSubscription)
+                .where(RestockSubscription.id.in_(ids))
+                .values(notified_at=datetime.utcnow())
+            )
+            db.commit()
+
+            queued += len(page)
+            last_id = ids[-1]
+    finally:
+        db.close()
+
+    logger.info("Queued %d restock emails for %s (%s)", queued, product_name, size)
+    return queued
@@ -0,0 +1,87 @@
+"""Production process model: gunicorn managing uvicorn workers.
+
+``gunicorn.conf.py`` preloads the app in the master and forks one worker per
+CPU. Workers run uvloop and httptools, are recycled after
+``WORKER_MAX_REQUESTS`` requests and drain on SIGTERM:
+
+1. Stock event streams are closed, since they would otherwise never finish.
+2. In-flight requests, including webhooks and their background tasks, finish
+   within ``WORKER_GRACEFUL_TIMEOUT`` minus ``LIFESPAN_SHUTDOWN_SECONDS``.
+3. Lifespan shutdown lets the email outbox finish batches already sent to
+   Resend.
+"""
+import math
+import os
+import sys
+from pathlib import Path
+from typing import Optional
+
+import uvicorn
+from gunicorn.arbiter import Arbiter
+from uvicorn.workers import UvicornWorker
+
+from app.core.cache import shared_backend
+from app.core.stock_stream import broadcaster
+from app.db.database import engine
+
+# Held back from the graceful timeout so lifespan shutdown can drain the outbox
+LIFESPAN_SHUTDOWN_SECONDS = 10
+
+
+def cpu_count() -> int:
+    """CPUs this process may use, honouring affinity and cgroup (container) quotas"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS
+        cpus = os.cpu_count() or 1
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def worker_count(configured: Optional[int] = None, cache_url: str = "") -> int:
+    """WEB_CONCURRENCY when set, else one worker per CPU (at least two), or one with a memory:// cache"""
+    if configured:
+        return configured
+    if cache_url.startswith("memory://"):
+        return 1
+    # Two keep the service up while one worker is being recycled
+    return max(2, cpu_count())
+
+
+def after_fork() -> None:
+    """Drop connections a worker inherited from the preloading master"""
+    # close=False leaves the parent's sockets alone; the worker opens its own
+    engine.dispose(close=False)
+    shared_backend.after_fork()
+
+
+class Server(uvicorn.Server):
+    """uvicorn server that ends stock event streams as soon as shutdown starts"""
+
+    async def shutdown(self, sockets=None) -> None:
+        broadcaster.close()
+        await super().shutdown(sockets=sockets)
+
+
+class Worker(UvicornWorker):
+    """Gunicorn worker class: uvloop + httptools, draining through ``Server``"""
+
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools"}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.config.timeout_graceful_shutdown = max(1, self.cfg.graceful_timeout - LIFESPAN_SHUTDOWN_SECONDS)
+
+    async def _serve(self) -> None:
+        # UvicornWorker._serve with our Server class
+        self.config.app = self.wsgi
+        server = Server(config=self.config)
+        self._install_sigquit_handler()
+        await server.serve(sockets=self.sockets)
+        if not server.started:
+            sys.exit(Arbiter.WORKER_BOOT_ERROR)
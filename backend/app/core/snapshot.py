@@ -0,0 +1,80 @@
+"""Last-known-good catalog snapshot on disk.
+
+Layout: an 8 byte magic, a fixed header (format version, catalog version,
+created_at, payload length) and the compact JSON payload. Files are written
+to a temporary sibling and swapped in with ``os.replace`` so readers never
+see a partial snapshot, and they are read back through ``mmap``.
+"""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"BALMCAT\x00"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sHqdQ")
+
+
+class CatalogSnapshot:
+    """Formatted catalog persisted at ``path``"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._digest: Optional[str] = None
+
+    def save(self, products: list[dict[str, Any]], version: int) -> bool:
+        """Atomically replace the snapshot; returns False when unchanged"""
+        payload = json.dumps(products, separators=(",", ":")).encode()
+        digest = hashlib.sha256(payload).hexdigest()
+        if digest == self._digest:
+            return False
+
+        header = _HEADER.pack(MAGIC, FORMAT_VERSION, version, time.time(), len(payload))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header)
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except OSError:
+            logger.exception("Failed to write catalog snapshot %s", self.path)
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return False
+
+        self._digest = digest
+        return True
+
+    def load(self) -> Optional[tuple[list[dict[str, Any]], float]]:
+        """Return (products, created_at), or None when missing or unreadable"""
+        try:
+            with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                magic, fmt, _version, created_at, length = _HEADER.unpack_from(mm, 0)
+                if magic != MAGIC or fmt != FORMAT_VERSION:
+                    logger.warning("Ignoring catalog snapshot with unknown format: %s", self.path)
+                    return None
+                payload = mm[_HEADER.size:_HEADER.size + length]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, struct.error):
+            logger.exception("Failed to read catalog snapshot %s", self.path)
+            return None
+
+        if len(payload) != length:
+            logger.warning("Truncated catalog snapshot: %s", self.path)
+            return None
+        self._digest = hashlib.sha256(payload).hexdigest()
+        return json.loads(payload), created_at
@@ -0,0 +1,343 @@
+"""Serving the built frontend (Vite's ``frontend/dist``).
+
+Compressible files get ``.gz`` and ``.br`` siblings written once, as a build
+step (scripts/precompress_frontend.py) or by the gunicorn master before it
+forks workers. Requests
+are then answered from whichever variant the client accepts, with no
+per-request compression. Content-hashed files under ``assets/`` are cached by
+browsers forever; ``index.html`` and other unhashed files get short lifetimes
+and are revalidated with ETags. Single byte ranges are honoured on the
+uncompressed file. Lookups go through an in-memory manifest built at
+startup, so serving a request does no stat() or open() for small files.
+"""
+import asyncio
+import gzip
+import hashlib
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from email.utils import formatdate
+from mimetypes import guess_type
+from pathlib import Path
+from typing import Optional
+
+import anyio
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+from app.core.compression import accepted_encodings, etag_matches
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is in requirements.txt
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_SUFFIXES = {
+    ".css", ".html", ".ico", ".js", ".json", ".map", ".mjs", ".svg", ".txt", ".webmanifest", ".xml",
+}
+# Below this, compression saves less than the extra headers cost
+MIN_COMPRESS_BYTES = 1024
+# Keep a variant only if it is meaningfully smaller than the original
+MAX_COMPRESSED_RATIO = 0.9
+# Preferred first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+UNHASHED = "public, max-age=3600"
+
+
+def _compressors():
+    compressors = {"gzip": lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressors["br"] = lambda data: brotli.compress(data, quality=11)
+    return compressors
+
+
+def _write_atomic(path: Path, data: bytes, mtime: float) -> None:
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        # mkstemp creates 0600; the server may run as a different user than the build
+        os.chmod(tmp, 0o644)
+        # Match the source mtime so a rebuilt source is detected as newer
+        os.utime(tmp, (mtime, mtime))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def precompress(root: Path) -> dict[str, int]:
+    """Write .br/.gz variants next to compressible files under ``root``.
+
+    Variants that are already up to date are left alone, so this is cheap
+    after the first run. Writes are atomic renames, so a server reading the
+    tree never sees a partial file.
+    """
+    compressors = _compressors()
+    written = skipped = 0
+    for path in root.rglob("*"):
+        if path.suffix not in COMPRESSIBLE_SUFFIXES or not path.is_file():
+            continue
+        source = path.stat()
+        if source.st_size < MIN_COMPRESS_BYTES:
+            continue
+        data = None
+        for encoding, suffix in ENCODINGS:
+            if encoding not in compressors:
+                continue
+            variant = path.with_name(path.name + suffix)
+            if variant.exists() and variant.stat().st_mtime == source.st_mtime:
+                skipped += 1
+                continue
+            if data is None:
+                data = path.read_bytes()
+            compressed = compressors[encoding](data)
+            if len(compressed) <= len(data) * MAX_COMPRESSED_RATIO:
+                _write_atomic(variant, compressed, source.st_mtime)
+                written += 1
+            elif variant.exists():
+                variant.unlink()
+    if brotli is None:
+        logger.warning("brotli is not installed; serving gzip variants only")
+    return {"written": written, "up_to_date": skipped}
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """Inclusive (start, end) for a single-range ``bytes=`` header.
+
+    Returns None when the header should be ignored (other units or several
+    ranges, which are answered with the full file) and raises
+    RangeNotSatisfiable when the range lies outside the file.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+@dataclass(frozen=True)
+class _Representation:
+    """One encoding of a file: where it lives and, if small, its bytes"""
+
+    path: Path
+    stat_result: os.stat_result
+    etag: str
+    body: Optional[bytes]
+
+
+@dataclass(frozen=True)
+class DistFile:
+    rel_path: str
+    size: int
+    mtime: float
+    digest: str
+    media_type: str
+    cache_control: str
+    last_modified: str
+    compressible: bool
+    # "identity" plus any fresh "br"/"gzip" variants
+    representations: dict[str, _Representation]
+
+
+class _FileRangeResponse(Response):
+    """206 response streaming bytes start..end (inclusive) of a file"""
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, path: Path, start: int, end: int, headers: dict, media_type: str):
+        self.path = path
+        self.start = start
+        self.end = end
+        super().__init__(status_code=206, headers=headers, media_type=media_type)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        remaining = self.end - self.start + 1
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _is_variant(path: Path) -> bool:
+    return path.suffix in (".br", ".gz") and path.with_suffix("").suffix in COMPRESSIBLE_SUFFIXES
+
+
+class StaticSite:
+    """In-memory manifest of a built frontend, served without filesystem lookups.
+
+    The manifest maps each URL path to its size, mtime, content digest and
+    precompressed variants; files up to SMALL_FILE_BYTES (and index.html,
+    whatever its size) are held in memory. ETags come from the content
+    digest, so they agree across workers and hosts. Call ``reload()`` after
+    the files change.
+    """
+
+    SMALL_FILE_BYTES = 64 * 1024
+
+    def __init__(self, root: Path):
+        self.root = root.resolve()
+        self._files: dict[str, DistFile] = {}
+        self.index: Optional[DistFile] = None
+        self.reload()
+
+    def cache_control(self, rel_path: str) -> str:
+        if rel_path.startswith("assets/"):
+            return IMMUTABLE
+        if rel_path.endswith(".html"):
+            return f"public, max-age={settings.STATIC_HTML_MAX_AGE_SECONDS}, must-revalidate"
+        return UNHASHED
+
+    def _representation(self, path: Path, stat_result: os.stat_result, etag: str, keep: bool):
+        body = None
+        if keep or stat_result.st_size <= self.SMALL_FILE_BYTES:
+            body = path.read_bytes()
+        return _Representation(path, stat_result, etag, body)
+
+    def _scan(self, path: Path) -> DistFile:
+        rel_path = path.relative_to(self.root).as_posix()
+        stat_result = path.stat()
+        digest = hashlib.blake2b(path.read_bytes(), digest_size=12).hexdigest()
+        keep = rel_path == "index.html"
+        representations = {
+            "identity": self._representation(path, stat_result, f'"{digest}"', keep),
+        }
+        compressible = path.suffix in COMPRESSIBLE_SUFFIXES
+        if compressible:
+            for encoding, suffix in ENCODINGS:
+                variant = path.with_name(path.name + suffix)
+                try:
+                    variant_stat = variant.stat()
+                except FileNotFoundError:
+                    continue
+                # A variant older than its source is left over from a previous build
+                if variant_stat.st_mtime == stat_result.st_mtime:
+                    representations[encoding] = self._representation(
+                        variant, variant_stat, f'"{digest}-{encoding}"', keep
+                    )
+        return DistFile(
+            rel_path=rel_path,
+            size=stat_result.st_size,
+            mtime=stat_result.st_mtime,
+            digest=digest,
+            media_type=guess_type(path.name)[0] or "application/octet-stream",
+            cache_control=self.cache_control(rel_path),
+            last_modified=formatdate(stat_result.st_mtime, usegmt=True),
+            compressible=compressible,
+            representations=representations,
+        )
+
+    def reload(self) -> None:
+        """Rebuild the manifest from disk and swap it in"""
+        files = {}
+        for path in self.root.rglob("*"):
+            if path.name.startswith(".") or _is_variant(path) or not path.is_file():
+                continue
+            try:
+                entry = self._scan(path)
+            except FileNotFoundError:
+                # Removed mid-scan by a rebuild; the next reload picks up the result
+                continue
+            files[entry.rel_path] = entry
+        self._files = files
+        self.index = files.get("index.html")
+        logger.info("Static manifest: %d files from %s", len(files), self.root)
+
+    def lookup(self, rel_path: str) -> Optional[DistFile]:
+        """The file for a URL path relative to the root, or None"""
+        return self._files.get(rel_path)
+
+    async def watch(self, stop_event: asyncio.Event) -> None:
+        """Reload whenever the dist tree changes, until ``stop_event`` is set (development only)"""
+        try:
+            from watchfiles import awatch
+        except ImportError:
+            logger.warning("STATIC_WATCH is set but watchfiles is not installed")
+            return
+        # Stopping via the event (not cancellation) lets the watcher thread exit first
+        async for _changes in awatch(self.root, stop_event=stop_event):
+            await anyio.to_thread.run_sync(self.reload)
+
+    def response(self, request: Request, entry: DistFile) -> Response:
+        identity = entry.representations["identity"]
+        headers = {
+            "cache-control": entry.cache_control,
+            "accept-ranges": "bytes",
+            "last-modified": entry.last_modified,
+        }
+        if entry.compressible:
+            headers["vary"] = "Accept-Encoding"
+
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header and (if_range is None or if_range == identity.etag):
+            try:
+                span = parse_range(range_header, entry.size)
+            except RangeNotSatisfiable:
+                headers["content-range"] = f"bytes */{entry.size}"
+                return Response(status_code=416, headers=headers)
+            if span is not None:
+                start, end = span
+                headers["etag"] = identity.etag
+                headers["content-range"] = f"bytes {start}-{end}/{entry.size}"
+                headers["content-length"] = str(end - start + 1)
+                if identity.body is not None:
+                    return Response(
+                        identity.body[start:end + 1], status_code=206,
+                        headers=headers, media_type=entry.media_type,
+                    )
+                return _FileRangeResponse(identity.path, start, end, headers, entry.media_type)
+
+        chosen, encoding = identity, None
+        if len(entry.representations) > 1:
+            accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+            for candidate, _suffix in ENCODINGS:
+                if candidate in accepted and candidate in entry.representations:
+                    chosen, encoding = entry.representations[candidate], candidate
+                    break
+
+        headers["etag"] = chosen.etag
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, chosen.etag):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["content-encoding"] = encoding
+        if chosen.body is not None:
+            return Response(chosen.body, headers=headers, media_type=entry.media_type)
+        return FileResponse(
+            chosen.path, headers=headers, media_type=entry.media_type, stat_result=chosen.stat_result
+        )
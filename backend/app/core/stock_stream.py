@@ -0,0 +1,176 @@
+"""Live stock levels for the storefront over server-sent events.
+
+The webhook publishes every stock change on a channel of the shared cache
+backend. With Redis or SQLite every worker hears about changes handled by any
+other (SQLite within ``CACHE_SQLITE_POLL_SECONDS``); the memory backend only
+reaches the worker that handled the webhook.
+Each worker renders an event into its SSE frame once and hands the same bytes
+to every subscriber.
+
+Subscriber queues are bounded. A client that falls ``STOCK_STREAM_QUEUE_SIZE``
+frames behind is disconnected instead of buffered. EventSource reconnects on
+its own with Last-Event-ID and is replayed from the ring of recent events, or
+sent ``event: reset`` (refetch /api/products) when it has fallen out of it.
+"""
+import asyncio
+import itertools
+import json
+import logging
+from collections import deque
+from typing import AsyncIterator, Optional
+
+from app.core.cache import CacheBackend, shared_backend
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge, registry
+
+logger = logging.getLogger(__name__)
+
+RETRY_FRAME = b"retry: 3000\n\n"
+HEARTBEAT_FRAME = b": ping\n\n"
+RESET_FRAME = b"event: reset\ndata: {}\n\n"
+
+STREAMS_DROPPED = registry.register(Counter(
+    "balm_stock_stream_dropped_total",
+    "Stock streams closed because the client fell too far behind",
+))
+
+
+class _Subscriber:
+    __slots__ = ("queue", "closed")
+
+    def __init__(self, size: int):
+        self.queue: asyncio.Queue[Optional[bytes]] = asyncio.Queue(size)
+        self.closed = False
+
+
+class StockBroadcaster:
+    """Fan-out of stock changes to this worker's open event streams"""
+
+    CHANNEL = "balm:stock"
+    SEQUENCE_KEY = "balm:stock:seq"
+
+    def __init__(self, backend: CacheBackend, history: int, queue_size: int):
+        self.backend = backend
+        self.queue_size = queue_size
+        self.closed = False
+        self._subscribers: set[_Subscriber] = set()
+        # (event id, frame) in delivery order
+        self._history: deque[tuple[int, bytes]] = deque(maxlen=history)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, product_id: str, size: str, stock: int, delta: int) -> None:
+        """Announce a stock change to every worker; failures are logged, not raised"""
+        try:
+            # The shared counter keeps ids unique across workers for Last-Event-ID
+            event_id = self.backend.incr(self.SEQUENCE_KEY)
+            self.backend.publish(self.CHANNEL, json.dumps(
+                {"id": event_id, "product_id": product_id, "size": size, "stock": stock, "delta": delta},
+                separators=(",", ":"),
+            ))
+        except Exception:
+            logger.exception("Failed to publish stock change for %s size %s", product_id, size)
+
+    async def run(self) -> None:
+        """Listen for stock changes and send heartbeats; one per worker"""
+        # The Redis backend delivers on its own thread, so keep the loop to hop back onto
+        self._loop = asyncio.get_running_loop()
+        self.backend.subscribe(self.CHANNEL, self._on_message)
+        while True:
+            await asyncio.sleep(settings.STOCK_STREAM_HEARTBEAT_SECONDS)
+            # Also flushes out dead connections: their queues fill and they are dropped
+            self._fan_out(HEARTBEAT_FRAME)
+
+    def _on_message(self, message: str) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._dispatch(message)
+        else:
+            loop.call_soon_threadsafe(self._dispatch, message)
+
+    def _dispatch(self, message: str) -> None:
+        try:
+            event_id = int(json.loads(message)["id"])
+        except (KeyError, TypeError, ValueError):
+            logger.warning("Ignoring malformed stock event: %r", message)
+            return
+        frame = f"id: {event_id}\nevent: stock\ndata: {message}\n\n".encode()
+        self._history.append((event_id, frame))
+        self._fan_out(frame)
+
+    def _fan_out(self, frame: bytes) -> None:
+        lagging = []
+        for subscriber in self._subscribers:
+            try:
+                subscriber.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                lagging.append(subscriber)
+        for subscriber in lagging:
+            subscriber.closed = True
+            self._subscribers.discard(subscriber)
+            STREAMS_DROPPED.inc()
+
+    def replay(self, last_event_id: Optional[str]) -> Optional[list[bytes]]:
+        """Frames after ``last_event_id``; None when it is no longer in the history"""
+        if not last_event_id:
+            return []
+        try:
+            wanted = int(last_event_id)
+        except ValueError:
+            return None
+        for position, (event_id, _) in enumerate(self._history):
+            if event_id == wanted:
+                return [frame for _, frame in itertools.islice(self._history, position + 1, None)]
+        return None
+
+    async def stream(self, last_event_id: Optional[str] = None) -> AsyncIterator[bytes]:
+        subscriber = _Subscriber(self.queue_size)
+        # Replay and subscribe without yielding in between, so nothing is missed or sent twice
+        missed = self.replay(last_event_id)
+        self._subscribers.add(subscriber)
+        try:
+            yield RETRY_FRAME
+            if missed is None:
+                yield RESET_FRAME
+            else:
+                for frame in missed:
+                    yield frame
+            while not subscriber.closed:
+                frame = await subscriber.queue.get()
+                if frame is None or subscriber.closed:
+                    break
+                yield frame
+        finally:
+            self._subscribers.discard(subscriber)
+
+    def close(self) -> None:
+        """End every open stream so shutdown isn't held up; clients reconnect elsewhere"""
+        self.closed = True
+        for subscriber in self._subscribers:
+            subscriber.closed = True
+            try:
+                subscriber.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+        self._subscribers.clear()
+
+
+broadcaster = StockBroadcaster(
+    shared_backend,
+    history=settings.STOCK_STREAM_HISTORY,
+    queue_size=settings.STOCK_STREAM_QUEUE_SIZE,
+)
+
+registry.register(Gauge(
+    "balm_stock_stream_subscribers",
+    "Open stock event streams in this worker",
+    callback=lambda: {(): len(broadcaster)},
+))
@@ -0,0 +1,100 @@
+"""Per-request time breakdown, switched on by the X-Trace header.
+
+When a request carries ``X-Trace: <PROFILING_TRACE_TOKEN>``, time spent in
+the database, bcrypt, JWT handling and upstream calls (Stripe, Google,
+Resend) is added up and returned in a ``Server-Timing`` response header,
+which browser dev tools display directly. Untraced requests pay for one
+context variable lookup per span.
+"""
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from sqlalchemy import event
+
+from app.core.config import settings
+
+# Totals in seconds by kind; the dict is shared with threadpool copies of the context
+_current: ContextVar[Optional[dict[str, float]]] = ContextVar("balm_trace", default=None)
+
+
+def record(kind: str, seconds: float) -> None:
+    totals = _current.get()
+    if totals is not None:
+        totals[kind] = totals.get(kind, 0.0) + seconds
+
+
+@contextmanager
+def trace_span(kind: str) -> Iterator[None]:
+    if _current.get() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(kind, time.perf_counter() - started)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("balm_query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("balm_query_started")
+    if started:
+        record("db", time.perf_counter() - started.pop())
+
+
+def instrument_engine(engine) -> None:
+    """Count query time on ``engine`` towards the "db" span of traced requests"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _server_timing(totals: dict[str, float], elapsed: float) -> bytes:
+    parts = [f"{kind};dur={seconds * 1000:.2f}" for kind, seconds in sorted(totals.items())]
+    parts.append(f"total;dur={elapsed * 1000:.2f}")
+    return ", ".join(parts).encode()
+
+
+class TraceMiddleware:
+    """Adds Server-Timing to requests that opt in with a valid X-Trace header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _wants_trace(self, scope) -> bool:
+        token = settings.PROFILING_TRACE_TOKEN
+        if not token:
+            return False
+        for name, value in scope["headers"]:
+            if name == b"x-trace":
+                return secrets.compare_digest(value, token.encode())
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wants_trace(scope):
+            await self.app(scope, receive, send)
+            return
+
+        totals: dict[str, float] = {}
+        reset = _current.set(totals)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append(
+                    (b"server-timing", _server_timing(totals, time.perf_counter() - started))
+                )
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(reset)
@@ -2,17 +2,38 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.metrics import Gauge, registry
+from app.core.tracing import instrument_engine
 
 engine = create_engine(
     settings.DATABASE_URL,
     connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
 )
 
+instrument_engine(engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
 
+def _pool_stats() -> dict[tuple[str, ...], float]:
+    stats = {}
+    for state in ("size", "checkedout", "checkedin", "overflow"):
+        reader = getattr(engine.pool, state, None)
+        if reader is not None:
+            stats[(state,)] = reader()
+    return stats
+
+
+registry.register(Gauge(
+    "balm_db_pool_connections",
+    "Database connection pool usage",
+    labels=("state",),
+    callback=_pool_stats,
+))
+
+
 def get_db():
     """Dependency for getting database session"""
     db = SessionLocal()
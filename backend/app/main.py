@@ -1,20 +1,70 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 
+from app.api.routes.admin import router as admin_router
 from app.api.routes.auth import router as auth_router
 from app.api.routes.checkout import router as checkout_router
+from app.api.routes.health import router as health_router
+from app.api.routes.metrics import router as metrics_router
 from app.api.routes.products import router as products_router
 from app.api.routes.stripe_webhook import router as stripe_webhook_router
 from app.db.database import engine, Base
+from app.core.compression import CompressionMiddleware
+from app.core.catalog import (
+    load_snapshot,
+    refresh_catalog_periodically,
+    warm_up_catalog,
+)
 from app.core.config import settings
+from app.core.email_outbox import outbox_sender
+from app.core.metrics import MetricsMiddleware
+from app.core.static_assets import StaticSite
+from app.core.stock_stream import broadcaster
+from app.core.tracing import TraceMiddleware
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="BALM Store API", version="1.0.0")
+# Built frontend (Vite output). When the build is missing (e.g. dev where Vite
+# serves the SPA itself), the API answers a JSON root instead.
+frontend_dist = Path(__file__).parent.parent.parent / "frontend" / "dist"
+# Variants are written at build time or by the gunicorn master (gunicorn.conf.py),
+# never per worker; without them files are served uncompressed.
+site = StaticSite(frontend_dist) if frontend_dist.exists() else None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start every worker with the last-known-good catalog in memory, then warm
+    # it from Stripe in the background; /api/health/ready reports 503 until then.
+    load_snapshot()
+    tasks = [
+        asyncio.create_task(warm_up_catalog()),
+        asyncio.create_task(refresh_catalog_periodically()),
+        asyncio.create_task(broadcaster.run()),
+    ]
+    watchers = []
+    stop_watching = asyncio.Event()
+    if site is not None and settings.STATIC_WATCH:
+        watchers.append(asyncio.create_task(site.watch(stop_watching)))
+    sender = asyncio.create_task(outbox_sender.run())
+    yield
+    for task in tasks:
+        task.cancel()
+    stop_watching.set()
+    broadcaster.close()
+    # Let email batches already handed to Resend finish before exiting
+    await outbox_sender.stop()
+    await asyncio.gather(*tasks, *watchers, sender, return_exceptions=True)
+
+
+app = FastAPI(title="BALM Store API", version="1.0.0", lifespan=lifespan)
 
 # CORS - Use settings from config
 app.add_middleware(
@@ -24,6 +74,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(TraceMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 # Mount the legacy backend public/ assets (kept for any backend-served images)
 public_dir = Path(__file__).parent.parent / "public"
@@ -31,35 +84,30 @@ if public_dir.exists():
     app.mount("/static", StaticFiles(directory=str(public_dir)), name="static")
 
 # API routers
+app.include_router(admin_router)
 app.include_router(auth_router)
 app.include_router(checkout_router)
+app.include_router(health_router)
+app.include_router(metrics_router)
 app.include_router(products_router)
 app.include_router(stripe_webhook_router)
 
-# Serve the built frontend (Vite output). When the build is missing (e.g. dev
-# where Vite serves the SPA itself), fall back to a JSON root so the API still
-# responds.
-frontend_dist = Path(__file__).parent.parent.parent / "frontend" / "dist"
-
-if frontend_dist.exists():
-    assets_dir = frontend_dist / "assets"
-    if assets_dir.exists():
-        app.mount(
-            "/assets",
-            StaticFiles(directory=str(assets_dir)),
-            name="frontend-assets",
-        )
-
+# Serve the built frontend: precompressed variants, immutable caching for the
+# hashed /assets files and short revalidated caching for index.html.
+if site is not None:
     @app.api_route("/{full_path:path}", methods=["GET", "HEAD"], include_in_schema=False)
-    async def serve_spa(full_path: str):
+    async def serve_spa(full_path: str, request: Request):
         # Don't let the SPA shell mask 404s on API consumers.
         if full_path.startswith("api/"):
             return JSONResponse({"detail": "Not Found"}, status_code=404)
         # Real files in dist (favicon, /img/..., etc.) win over the shell.
-        candidate = frontend_dist / full_path
-        if full_path and candidate.is_file():
-            return FileResponse(candidate)
-        return FileResponse(frontend_dist / "index.html")
+        entry = site.lookup(full_path)
+        if entry is not None:
+            return site.response(request, entry)
+        # A missing hashed asset must 404, not load the shell as a script
+        if full_path.startswith("assets/") or site.index is None:
+            return JSONResponse({"detail": "Not Found"}, status_code=404)
+        return site.response(request, site.index)
 else:
     @app.get("/")
     def root():
@@ -67,5 +115,14 @@ else:
 
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Production launcher: gunicorn managing uvicorn workers (gunicorn.conf.py).
+    # For development use `uvicorn app.main:app --reload`.
+    import os
+    import sys
+    backend_dir = Path(__file__).parent.parent
+    os.execvp(sys.executable, [
+        sys.executable, "-m", "gunicorn",
+        "--chdir", str(backend_dir),
+        "--config", str(backend_dir / "gunicorn.conf.py"),
+        "app.main:app",
+    ])
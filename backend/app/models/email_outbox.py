@@ -0,0 +1,25 @@
+from sqlalchemy import Column, DateTime, Integer, String, Text
+from sqlalchemy.sql import func
+
+from app.db.database import Base
+
+
+class EmailOutbox(Base):
+    """Transactional email waiting to be sent by the background sender"""
+
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    to_email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    html = Column(Text, nullable=False)
+    text = Column(Text, nullable=True)
+    dedupe_key = Column(String, nullable=True, index=True)  # e.g. "password-reset:<email>"
+    status = Column(String, nullable=False, default="pending", index=True)  # pending, sending, sent, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, server_default=func.now(), index=True)
+    claimed_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    provider_id = Column(String, nullable=True)  # Resend email ID
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime, nullable=True)
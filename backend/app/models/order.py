@@ -0,0 +1,50 @@
+from sqlalchemy import Boolean, Column, Date, DateTime, ForeignKey, Index, Integer, String, false
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+
+from app.db.database import Base
+
+
+class Order(Base):
+    """A completed Stripe Checkout Session"""
+
+    __tablename__ = "orders"
+
+    id = Column(Integer, primary_key=True, index=True)
+    stripe_session_id = Column(String, unique=True, nullable=False, index=True)
+    customer_email = Column(String, nullable=True, index=True)
+    amount_total = Column(Integer, nullable=False, default=0)  # In cents
+    currency = Column(String, nullable=False, default="usd")
+    placed_at = Column(DateTime, nullable=False, index=True)  # When checkout completed (UTC)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
+
+
+class OrderItem(Base):
+    __tablename__ = "order_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
+    product_id = Column(String, nullable=False, index=True)
+    size = Column(String, nullable=False, default="")  # "" for unsized products
+    quantity = Column(Integer, nullable=False)
+    amount = Column(Integer, nullable=False)  # Line total in cents
+    # Set once Stripe stock has been decremented for this line
+    inventory_applied = Column(Boolean, nullable=False, default=False, server_default=false())
+
+    order = relationship("Order", back_populates="items")
+
+
+class DailySales(Base):
+    """Sales rollup per (day, product, size), updated as each order lands"""
+
+    __tablename__ = "daily_sales"
+    __table_args__ = (Index("ix_daily_sales_product_day", "product_id", "day"),)
+
+    day = Column(Date, primary_key=True)
+    product_id = Column(String, primary_key=True)
+    size = Column(String, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(Integer, nullable=False, default=0)  # In cents
+    orders = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,45 @@
+from sqlalchemy import Column, DateTime, Integer, String
+
+from app.db.database import Base
+
+
+class StockHold(Base):
+    """Stock held for an open Stripe Checkout Session"""
+
+    __tablename__ = "stock_holds"
+
+    id = Column(Integer, primary_key=True, index=True)
+    hold_id = Column(String, nullable=False, index=True)  # Provisional ID until the session exists
+    session_id = Column(String, nullable=True, index=True)  # Stripe Checkout Session ID
+    product_id = Column(String, nullable=False)
+    size = Column(String, nullable=False)
+    quantity = Column(Integer, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class StockHoldTotal(Base):
+    """Running total of held units per (product, size).
+
+    Holds are taken with a conditional UPDATE on this row, which keeps them
+    atomic across workers without locking the holds table.
+    """
+
+    __tablename__ = "stock_hold_totals"
+
+    product_id = Column(String, primary_key=True)
+    size = Column(String, primary_key=True)
+    held = Column(Integer, nullable=False, default=0)
+
+
+class CheckoutSessionHold(Base):
+    """Which provisional hold owns a Stripe Checkout Session.
+
+    The primary key lets exactly one hold claim a session, however many
+    idempotent replays of it race to attach theirs.
+    """
+
+    __tablename__ = "checkout_session_holds"
+
+    session_id = Column(String, primary_key=True)
+    hold_id = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, DateTime, Index, Integer, String, UniqueConstraint
+from sqlalchemy.sql import func
+
+from app.db.database import Base
+
+
+class RestockSubscription(Base):
+    """A shopper waiting for a sold-out (product, size) to come back"""
+
+    __tablename__ = "restock_subscriptions"
+    __table_args__ = (
+        UniqueConstraint("product_id", "size", "email", name="uq_restock_subscriber"),
+        # Fan-out pages through pending subscribers of one size in id order
+        Index("ix_restock_pending", "product_id", "size", "notified_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(String, nullable=False)
+    size = Column(String, nullable=False)
+    email = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    notified_at = Column(DateTime, nullable=True)  # Cleared again on re-subscribe
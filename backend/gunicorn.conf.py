@@ -0,0 +1,45 @@
+"""
+Gunicorn settings for production; read automatically by `gunicorn app.main:app`
+from this directory. Process model and shutdown are described in app/core/server.py.
+"""
+import os
+
+from app.core.config import settings
+from app.core.server import after_fork, worker_count
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = worker_count(settings.WEB_CONCURRENCY, settings.CACHE_URL)
+worker_class = "app.core.server.Worker"
+
+# Import the app once in the master so workers share its memory copy-on-write
+preload_app = True
+
+# Replace workers after a jittered number of requests to bound memory growth
+max_requests = settings.WORKER_MAX_REQUESTS
+max_requests_jitter = settings.WORKER_MAX_REQUESTS_JITTER
+
+graceful_timeout = settings.WORKER_GRACEFUL_TIMEOUT
+keepalive = 5
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    after_fork()
+
+
+def on_starting(server):
+    # Runs once, after the app is preloaded and before workers fork, so they
+    # inherit a manifest that already lists the variants
+    from app.core.static_assets import precompress
+    from app.main import frontend_dist, site
+
+    if site is not None:
+        stats = precompress(frontend_dist)
+        site.reload()
+        server.log.info("Static variants: %(written)d written, %(up_to_date)d up to date", stats)
+
+    if workers > 1 and settings.CACHE_URL.startswith("memory://"):
+        server.log.warning(
+            "CACHE_URL=memory:// with %d workers; see docs/DEPLOYMENT.md (Shared cache)",
+            workers,
+        )
@@ -0,0 +1,89 @@
+"""
+Benchmark CPU cost vs bytes saved for API compression at each level
+Uses the catalog snapshot when one exists, otherwise a synthetic catalog.
+Usage: python scripts/bench_api_compression.py [--products 60] [--snapshot catalog.snapshot]
+"""
+import argparse
+import json
+import random
+import sys
+import timeit
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.catalog import CatalogSnapshot, format_product
+from app.core.compression import CODECS, CompressedPayload, compress
+from app.core.config import settings
+
+LEVELS = {
+    "gzip": (1, 3, 6, 9),
+    "br": (1, 3, 5, 7, 9, 11),
+    "zstd": (1, 3, 6, 9, 15, 19),
+}
+SIZES = ["S", "M", "L", "XL", "2XL"]
+
+
+def synthetic_catalog(count: int) -> list[dict]:
+    products = []
+    for i in range(count):
+        metadata = {
+            "category": random.choice(["apparel", "art", "accessories"]),
+            "sizes": ",".join(SIZES),
+            "colors": "Black, Bone, Washed Olive",
+            "details": "Heavyweight 14oz cotton. Garment dyed. Screen printed by hand. " * 3,
+            **{f"stock_{size}": str(random.randint(0, 40)) for size in SIZES},
+        }
+        products.append(format_product({
+            "id": f"prod_{i:014d}",
+            "name": f"BALM Product {i}",
+            "description": "A soft, boxy piece made in small batches for everyday wear. " * 4,
+            "images": [f"https://files.stripe.com/links/product_{i}_{n}.png" for n in range(3)],
+            "metadata": metadata,
+            "default_price": {"id": f"price_{i:014d}", "unit_amount": random.randint(20, 200) * 100},
+        }))
+    return products
+
+
+def best_time(fn) -> float:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=60)
+    parser.add_argument("--snapshot", default=settings.CATALOG_SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    loaded = CatalogSnapshot(args.snapshot).load()
+    products = loaded[0] if loaded else synthetic_catalog(args.products)
+    source = f"snapshot {args.snapshot}" if loaded else f"{args.products} synthetic products"
+    body = json.dumps({"products": products}, ensure_ascii=False, separators=(",", ":")).encode()
+    print(f"\n🗜️  /api/products payload: {len(body):,} bytes ({source})\n")
+    print(f"{'codec':<6} {'level':>5} {'bytes':>10} {'saved':>7} {'compress':>11} {'MB/s':>8}")
+
+    for encoding, levels in LEVELS.items():
+        if encoding not in CODECS:
+            print(f"{encoding:<6}  (not installed)")
+            continue
+        for level in levels:
+            compressed = compress(body, encoding, level)
+            seconds = best_time(lambda: compress(body, encoding, level))
+            print(
+                f"{encoding:<6} {level:>5} {len(compressed):>10,} "
+                f"{1 - len(compressed) / len(body):>6.1%} {seconds * 1e3:>8.2f} ms "
+                f"{len(body) / seconds / 1e6:>8.1f}"
+            )
+
+    payload = CompressedPayload(body)
+    encoding = next(e for e in ("zstd", "br", "gzip") if e in CODECS)
+    payload.encoded(encoding)
+    cached = best_time(lambda: payload.encoded(encoding))
+    print(f"\nCached {encoding} body per request (CompressedPayload): {cached * 1e6:.2f} µs\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark server-side cart validation cost against cart size
+Usage: python scripts/bench_cart_validation.py [--products 500]
+"""
+import argparse
+import random
+import sys
+import timeit
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.cart import resolve_cart
+from app.core.catalog import CatalogIndex
+
+SIZES = ["S", "M", "L", "XL", "2XL", "3XL"]
+
+
+def build_catalog(count: int) -> list[dict]:
+    return [
+        {
+            "id": f"prod_{i:06d}",
+            "stripePriceId": f"price_{i:06d}",
+            "sizes": SIZES,
+            "inventory": {size: 10_000 for size in SIZES},
+        }
+        for i in range(count)
+    ]
+
+
+def build_cart(catalog: list[dict], size: int) -> list[SimpleNamespace]:
+    return [
+        SimpleNamespace(
+            stripeProductId=product["id"],
+            productId=None,
+            price=product["stripePriceId"],
+            size=random.choice(SIZES),
+            quantity=random.randint(1, 3),
+        )
+        for product in random.choices(catalog, k=size)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=500)
+    args = parser.parse_args()
+
+    catalog = build_catalog(args.products)
+    build_time = timeit.timeit(lambda: CatalogIndex(catalog), number=20) / 20
+    index = CatalogIndex(catalog)
+    print(f"\n📦 Catalog: {args.products} products, index build {build_time * 1e3:.2f} ms\n")
+    print(f"{'cart items':>10}  {'per cart':>12}  {'per item':>10}")
+
+    for cart_size in (1, 5, 10, 50, 100, 500, 1000):
+        cart = build_cart(catalog, cart_size)
+        timer = timeit.Timer(lambda: resolve_cart(cart, index))
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=5, number=number)) / number
+        print(f"{cart_size:>10}  {best * 1e6:>9.1f} µs  {best * 1e6 / cart_size:>7.2f} µs")
+    print()
+
+
+if __name__ == "__main__":
+    main()
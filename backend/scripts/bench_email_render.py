@@ -0,0 +1,42 @@
+"""
+Benchmark email template rendering throughput
+Usage: python scripts/bench_email_render.py [--count 10000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.email_templates import templates
+
+
+def bench(name: str, count: int, make_values) -> float:
+    values = [make_values(i) for i in range(count)]
+    started = time.perf_counter()
+    for v in values:
+        templates.render(name, **v)
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=10_000)
+    args = parser.parse_args()
+
+    print(f"\n✉️  Rendering {args.count} emails per template (subject + HTML + text)\n")
+    cases = {
+        "welcome": lambda i: {"display_name": f"Shopper {i}"},
+        "password_reset": lambda i: {"reset_url": f"https://balmsoothes.com/reset-password?token={i:032x}"},
+        "verify_email": lambda i: {"verification_url": f"https://balmsoothes.com/verify-email?token={i:032x}"},
+    }
+    for name, make_values in cases.items():
+        rate = bench(name, args.count, make_values)
+        print(f"{name:>16}: {rate:>10,.0f} emails/s  ({1e6 / rate:.1f} µs each)")
+    print()
+
+
+if __name__ == "__main__":
+    main()
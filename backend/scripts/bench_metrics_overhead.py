@@ -0,0 +1,79 @@
+"""
+Benchmark per-request overhead of the metrics middleware
+Usage: python scripts/bench_metrics_overhead.py [--requests 50000]
+
+Calls a minimal FastAPI app directly through ASGI (no sockets) with and
+without MetricsMiddleware and reports the difference per request.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi import FastAPI
+
+from app.core.metrics import MetricsMiddleware
+
+
+def build_app(with_metrics: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/products/{product_id}")
+    async def product(product_id: str):
+        return {"id": product_id}
+
+    if with_metrics:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def drive(app, count: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    def scope():
+        return {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/api/products/prod_123",
+            "raw_path": b"/api/products/prod_123",
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"host", b"bench")],
+            "client": ("127.0.0.1", 1234),
+            "server": ("bench", 80),
+        }
+
+    for _ in range(1000):  # Warm up (builds the middleware stack)
+        await app(scope(), receive, send)
+    started = time.perf_counter()
+    for _ in range(count):
+        await app(scope(), receive, send)
+    return (time.perf_counter() - started) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=50_000)
+    args = parser.parse_args()
+
+    baseline = min(asyncio.run(drive(build_app(False), args.requests)) for _ in range(3))
+    measured = min(asyncio.run(drive(build_app(True), args.requests)) for _ in range(3))
+    print(f"\n📈 {args.requests} requests per run, best of 3\n")
+    print(f"  without metrics: {baseline * 1e6:8.2f} µs/request")
+    print(f"  with metrics:    {measured * 1e6:8.2f} µs/request")
+    print(f"  overhead:        {(measured - baseline) * 1e6:8.2f} µs/request\n")
+
+
+if __name__ == "__main__":
+    main()
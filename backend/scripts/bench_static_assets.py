@@ -0,0 +1,98 @@
+"""
+Measure bandwidth and time-to-first-byte for the built frontend
+Writes the .br/.gz variants first, so it also works as a build step.
+Usage: python scripts/bench_static_assets.py [--dist ../frontend/dist] [--requests 200]
+"""
+import argparse
+import gzip
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.core.static_assets import COMPRESSIBLE_SUFFIXES, StaticSite, precompress
+
+
+def build_app(site: StaticSite, on_the_fly: bool) -> Starlette:
+    async def serve(request: Request):
+        entry = site.lookup(request.path_params["path"])
+        if not on_the_fly:
+            return site.response(request, entry)
+        # What GZipMiddleware would do: compress the file on every request
+        body = gzip.compress((site.root / entry.rel_path).read_bytes(), compresslevel=6)
+        return Response(body, headers={"content-encoding": "gzip"})
+
+    return Starlette(routes=[Route("/{path:path}", serve)])
+
+
+def ttfb(client: TestClient, url: str, encoding: str, count: int) -> float:
+    """Median seconds until the first body chunk arrives"""
+    samples = []
+    for _ in range(count):
+        started = time.perf_counter()
+        with client.stream("GET", url, headers={"accept-encoding": encoding}) as response:
+            next(response.iter_raw())
+            samples.append(time.perf_counter() - started)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dist", type=Path, default=Path(__file__).parent.parent.parent / "frontend" / "dist")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    if not (args.dist / "index.html").exists():
+        sys.exit(f"❌ No build at {args.dist}; run `npm run build` in frontend/ first")
+
+    started = time.perf_counter()
+    stats = precompress(args.dist)
+    print(f"\n🗜️  Precompressed in {time.perf_counter() - started:.2f}s "
+          f"({stats['written']} written, {stats['up_to_date']} up to date)\n")
+
+    files = sorted(
+        p for p in args.dist.rglob("*")
+        if p.is_file() and p.suffix in COMPRESSIBLE_SUFFIXES
+    )
+    totals = {"identity": 0, "gzip": 0, "br": 0}
+    print(f"{'file':<48} {'raw':>9} {'gzip':>9} {'br':>9}")
+    for path in files:
+        raw = path.stat().st_size
+        sizes = {"identity": raw}
+        for encoding, suffix in (("gzip", ".gz"), ("br", ".br")):
+            variant = path.with_name(path.name + suffix)
+            sizes[encoding] = variant.stat().st_size if variant.exists() else raw
+        for key in totals:
+            totals[key] += sizes[key]
+        name = path.relative_to(args.dist).as_posix()
+        print(f"{name[-48:]:<48} {raw:>9,} {sizes['gzip']:>9,} {sizes['br']:>9,}")
+    print(f"{'total':<48} {totals['identity']:>9,} {totals['gzip']:>9,} {totals['br']:>9,}")
+    for encoding in ("gzip", "br"):
+        saved = 1 - totals[encoding] / totals["identity"]
+        print(f"  {encoding}: {saved:.1%} fewer bytes than uncompressed")
+
+    largest = max(files, key=lambda p: p.stat().st_size)
+    url = "/" + largest.relative_to(args.dist).as_posix()
+    site = StaticSite(args.dist)
+    precomputed = TestClient(build_app(site, on_the_fly=False))
+    dynamic = TestClient(build_app(site, on_the_fly=True))
+
+    print(f"\n⏱️  Median time to first byte for {url} ({args.requests} requests)\n")
+    print(f"  uncompressed           {ttfb(precomputed, url, 'identity', args.requests) * 1e3:7.2f} ms")
+    print(f"  gzip on the fly        {ttfb(dynamic, url, 'gzip', args.requests) * 1e3:7.2f} ms")
+    print(f"  precompressed gzip     {ttfb(precomputed, url, 'gzip', args.requests) * 1e3:7.2f} ms")
+    print(f"  precompressed brotli   {ttfb(precomputed, url, 'br', args.requests) * 1e3:7.2f} ms")
+    print()
+
+
+if __name__ == "__main__":
+    main()
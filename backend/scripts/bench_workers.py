@@ -0,0 +1,79 @@
+"""
+Benchmark throughput vs worker count under the production launcher
+Runs scripts/loadtest.py with --server gunicorn once per worker count, driving
+only the products and session endpoints, and prints requests/s and latency
+percentiles for each. Compare against the CPU count to pick WEB_CONCURRENCY.
+Usage: python scripts/bench_workers.py [--workers 1,2,4] [--duration 20] [--concurrency 100]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.server import cpu_count
+
+SCRIPTS_DIR = Path(__file__).parent
+ENDPOINTS = ("GET /api/products", "GET /api/auth/session")
+
+
+def default_worker_counts() -> str:
+    cpus = cpu_count()
+    return ",".join(str(n) for n in sorted({1, 2, cpus, cpus * 2}))
+
+
+def run_loadtest(workers: int, args, out: Path) -> dict:
+    subprocess.run(
+        [
+            sys.executable, str(SCRIPTS_DIR / "loadtest.py"),
+            "--server", "gunicorn",
+            "--workers", str(workers),
+            "--duration", str(args.duration),
+            "--concurrency", str(args.concurrency),
+            "--mix", args.mix,
+            "--latency-ms", str(args.latency_ms),
+            "--jitter-ms", str(args.jitter_ms),
+            "--out", str(out),
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    return json.loads(out.read_text())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default=default_worker_counts(), help="comma-separated worker counts")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--mix", default="browse=50,session=50")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fake upstream latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    counts = [int(n) for n in args.workers.split(",")]
+    print(f"\n⚙️  {cpu_count()} CPU(s); {args.concurrency} clients for {args.duration:.0f}s per run ({args.mix})\n")
+    print(f"{'workers':>7} {'endpoint':<24} {'rps':>9} {'p50':>8} {'p95':>8} {'p99':>8}")
+
+    baseline = None
+    with tempfile.TemporaryDirectory(prefix="balm-bench-workers-") as workdir:
+        for workers in counts:
+            report = run_loadtest(workers, args, Path(workdir) / f"workers-{workers}.json")
+            rows = [(name, report["endpoints"][name]) for name in ENDPOINTS if name in report["endpoints"]]
+            rows.append(("total", report["total"]))
+            for name, row in rows:
+                print(
+                    f"{workers:>7} {name:<24} {row['rps']:>9.1f} "
+                    f"{row['p50_ms']:>6.1f}ms {row['p95_ms']:>6.1f}ms {row['p99_ms']:>6.1f}ms"
+                )
+            total = report["total"]["rps"]
+            baseline = baseline or total
+            print(f"{'':>7} {'speedup vs first':<24} {total / baseline:>8.2f}x\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Fake Stripe, Google OAuth and Resend APIs for load testing
+Implements only the endpoints the backend calls, with injected latency and
+errors. Point the backend at it with STRIPE_API_BASE, GOOGLE_TOKEN_URL,
+GOOGLE_USERINFO_URL and RESEND_API_URL (scripts/loadtest.py does this).
+Usage: python scripts/fake_upstreams.py [--port 9100] [--latency-ms 80] [--jitter-ms 40] [--error-rate 0.01]
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import re
+import time
+import uuid
+from dataclasses import dataclass
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+SIZES = ["S", "M", "L", "XL"]
+_METADATA_KEY_RE = re.compile(r"^metadata\[(.+)\]$")
+_LINE_ITEM_RE = re.compile(r"^line_items\[(\d+)\]\[(price|quantity)\]$")
+
+
+@dataclass
+class Faults:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+
+
+faults = Faults()
+products: dict[str, dict] = {}
+sessions: dict[str, list[dict]] = {}
+_ids = itertools.count(1)
+
+
+def seed_products(count: int, stock: int) -> None:
+    products.clear()
+    for i in range(count):
+        product_id = f"prod_load{i:06d}"
+        products[product_id] = {
+            "id": product_id,
+            "object": "product",
+            "active": True,
+            "name": f"Load Test Product {i}",
+            "description": "Heavyweight cotton tee, garment dyed and printed by hand. " * 3,
+            "images": [f"https://files.example.com/{product_id}_{n}.png" for n in range(3)],
+            "metadata": {
+                "category": "apparel",
+                "sizes": ",".join(SIZES),
+                "colors": "Black, Bone",
+                **{f"stock_{size}": str(stock) for size in SIZES},
+            },
+            "default_price": {
+                "id": f"price_load{i:06d}",
+                "object": "price",
+                "product": product_id,
+                "unit_amount": 4000 + i * 100,
+                "currency": "usd",
+            },
+        }
+
+
+async def _inject(service: str):
+    """Sleep for the configured latency; return an error response if one is due"""
+    delay = faults.latency_ms + random.uniform(-faults.jitter_ms, faults.jitter_ms)
+    if delay > 0:
+        await asyncio.sleep(delay / 1000)
+    if random.random() < faults.error_rate:
+        if service == "stripe":
+            return JSONResponse(
+                {"error": {"type": "api_error", "message": "Injected failure"}}, status_code=500
+            )
+        return JSONResponse({"error": "Injected failure"}, status_code=500)
+    return None
+
+
+def _list(data: list, url: str, has_more: bool = False) -> dict:
+    return {"object": "list", "data": data, "has_more": has_more, "url": url}
+
+
+async def list_products(request: Request):
+    if error := await _inject("stripe"):
+        return error
+    ids = list(products)
+    limit = int(request.query_params.get("limit") or 10)
+    after = request.query_params.get("starting_after")
+    start = ids.index(after) + 1 if after in products else 0
+    page = [products[i] for i in ids[start:start + limit]]
+    return JSONResponse(_list(page, "/v1/products", has_more=start + limit < len(ids)))
+
+
+async def product(request: Request):
+    if error := await _inject("stripe"):
+        return error
+    item = products.get(request.path_params["product_id"])
+    if item is None:
+        return JSONResponse(
+            {"error": {"type": "invalid_request_error", "message": "No such product"}}, status_code=404
+        )
+    if request.method == "POST":
+        form = await request.form()
+        for key, value in form.items():
+            m = _METADATA_KEY_RE.match(key)
+            if m:
+                item["metadata"][m.group(1)] = value
+    return JSONResponse(item)
+
+
+async def create_session(request: Request):
+    if error := await _inject("stripe"):
+        return error
+    form = await request.form()
+    lines: dict[int, dict] = {}
+    for key, value in form.items():
+        m = _LINE_ITEM_RE.match(key)
+        if m:
+            lines.setdefault(int(m.group(1)), {})[m.group(2)] = value
+    session_id = f"cs_test_load{next(_ids):08d}"
+    sessions[session_id] = [lines[i] for i in sorted(lines)]
+    return JSONResponse({
+        "id": session_id,
+        "object": "checkout.session",
+        "url": f"https://checkout.stripe.com/c/pay/{session_id}",
+        "expires_at": int(form.get("expires_at") or time.time() + 1800),
+        "metadata": {},
+    })
+
+
+async def session_line_items(request: Request):
+    if error := await _inject("stripe"):
+        return error
+    session_id = request.path_params["session_id"]
+    # Sessions minted by the load generator itself get one default line
+    lines = sessions.get(session_id) or [{"price": "price_load000000", "quantity": "1"}]
+    data = []
+    for position, line in enumerate(lines):
+        price_id = line["price"]
+        product_id = "prod_load" + price_id.removeprefix("price_load")
+        price = (products.get(product_id) or {}).get("default_price") or {
+            "id": price_id, "object": "price", "product": product_id, "unit_amount": 4000,
+        }
+        quantity = int(line.get("quantity") or 1)
+        data.append({
+            "id": f"li_{session_id}_{position}",
+            "object": "item",
+            "price": price,
+            "quantity": quantity,
+            "amount_total": price["unit_amount"] * quantity,
+        })
+    return JSONResponse(_list(data, f"/v1/checkout/sessions/{session_id}/line_items"))
+
+
+async def google_token(request: Request):
+    if error := await _inject("google"):
+        return error
+    form = await request.form()
+    return JSONResponse({"access_token": f"fake-{form.get('code')}", "token_type": "Bearer"})
+
+
+async def google_userinfo(request: Request):
+    if error := await _inject("google"):
+        return error
+    code = request.headers.get("authorization", "").removeprefix("Bearer fake-")
+    return JSONResponse({
+        "email": f"{code}@loadtest.example.com",
+        "name": f"Load {code}",
+        "picture": "https://lh3.example.com/avatar.png",
+    })
+
+
+async def resend_email(request: Request):
+    if error := await _inject("resend"):
+        return error
+    return JSONResponse({"id": str(uuid.uuid4())})
+
+
+async def resend_batch(request: Request):
+    if error := await _inject("resend"):
+        return error
+    emails = await request.json()
+    return JSONResponse({"data": [{"id": str(uuid.uuid4())} for _ in emails]})
+
+
+app = Starlette(routes=[
+    Route("/v1/products", list_products, methods=["GET"]),
+    Route("/v1/products/{product_id}", product, methods=["GET", "POST"]),
+    Route("/v1/checkout/sessions", create_session, methods=["POST"]),
+    Route("/v1/checkout/sessions/{session_id}/line_items", session_line_items, methods=["GET"]),
+    Route("/google/token", google_token, methods=["POST"]),
+    Route("/google/userinfo", google_userinfo, methods=["GET"]),
+    Route("/emails", resend_email, methods=["POST"]),
+    Route("/emails/batch", resend_batch, methods=["POST"]),
+])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--products", type=int, default=40)
+    parser.add_argument("--stock", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    faults.latency_ms = args.latency_ms
+    faults.jitter_ms = args.jitter_ms
+    faults.error_rate = args.error_rate
+    seed_products(args.products, args.stock)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
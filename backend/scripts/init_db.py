@@ -11,6 +11,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from sqlalchemy.orm import Session
 from app.db.database import SessionLocal, engine, Base
 from app.models.user import User
+from app.models import email_outbox, order, reservation, restock  # noqa: F401 - registers tables
 from app.core.security import get_password_hash
 from app.core.config import settings
 
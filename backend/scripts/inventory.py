@@ -0,0 +1,446 @@
+"""
+Inventory snapshots, diffs and reconciliation straight from Stripe
+Products are read page by page (the next page is fetched while the current one
+is written) and formatted with the same code as /api/products. Snapshots are
+CSV sorted by product and size, with the name and price written once per
+product. Sorting spills to temporary runs and diffs are a merge of two sorted
+streams, so memory stays flat however large the catalog grows.
+Usage:
+  python scripts/inventory.py report [--json]
+  python scripts/inventory.py snapshot [--dir .]
+  python scripts/inventory.py diff OLD.csv NEW.csv [--out changes.csv]
+  python scripts/inventory.py reconcile LEDGER.csv [--snapshot FILE.csv | --apply]
+"""
+import argparse
+import csv
+import heapq
+import json
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from itertools import groupby
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import stripe
+
+from app.core.catalog import format_product
+from app.core.config import settings
+from app.core.metrics import upstream_call
+
+PAGE_SIZE = 100
+SORT_CHUNK_ROWS = 50_000
+LOW_STOCK = 5
+SIZE_ORDER = {size: rank for rank, size in enumerate(["XS", "S", "M", "L", "XL", "2XL", "3XL", "4XL"])}
+SNAPSHOT_HEADER = ["product_id", "size", "stock", "price", "name"]
+# Columns written by the old Node exporter, so earlier snapshots still diff
+LEGACY_COLUMNS = {"Product ID": "product_id", "Size": "size", "Stock": "stock", "Price": "price", "Product Name": "name"}
+
+
+class StockRow(NamedTuple):
+    product_id: str
+    size: str
+    stock: int
+    price: float
+    name: str
+
+
+def sort_key(row: StockRow) -> tuple:
+    return row.product_id, SIZE_ORDER.get(row.size, len(SIZE_ORDER)), row.size
+
+
+def stock_status(stock: int) -> str:
+    if stock == 0:
+        return "OUT"
+    if stock <= LOW_STOCK:
+        return "LOW"
+    return "OK"
+
+
+def _money(amount: float) -> str:
+    return f"{amount:.2f}".rstrip("0").rstrip(".")
+
+
+# --- Stripe -------------------------------------------------------------------
+
+def _fetch_page(params: dict):
+    with upstream_call("stripe", "Product.list"):
+        return stripe.Product.list(**params)
+
+
+def iter_pages(page_size: int = PAGE_SIZE) -> Iterator[list]:
+    """Active products a page at a time, prefetching the next page in the background"""
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    stripe.api_base = settings.STRIPE_API_BASE
+    params = {"active": True, "expand": ["data.default_price"], "limit": page_size}
+    # List pagination is cursor based, so pages can't be requested out of
+    # order; overlapping each request with the work on the previous page is
+    # as concurrent as it gets without holding the whole catalog.
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = pool.submit(_fetch_page, params)
+        while pending is not None:
+            page = pending.result()
+            pending = None
+            if page.has_more and page.data:
+                pending = pool.submit(_fetch_page, {**params, "starting_after": page.data[-1]["id"]})
+            yield page.data
+
+
+def iter_products() -> Iterator[dict]:
+    for page in iter_pages():
+        for product in page:
+            yield format_product(product)
+
+
+def product_rows(product: dict) -> list[StockRow]:
+    inventory = product["inventory"] or {}
+    return [
+        StockRow(product["id"], size, inventory.get(size, 0), product["price"], product["title"] or "")
+        for size in product["sizes"]
+    ]
+
+
+def iter_live_rows(warn: bool = True) -> Iterator[StockRow]:
+    for product in iter_products():
+        if not product["sizes"]:
+            if warn:
+                print(f"⚠️  Product \"{product['title']}\" has no sizes defined, skipping...", file=sys.stderr)
+            continue
+        yield from product_rows(product)
+
+
+# --- Sorted CSV streams -------------------------------------------------------
+
+def read_rows(path: Path) -> Iterator[StockRow]:
+    """Rows from a snapshot or ledger; blank name/price repeat the previous row's"""
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        columns = [LEGACY_COLUMNS.get(name.strip(), name.strip().lower()) for name in header]
+        if "quantity" in columns and "stock" not in columns:
+            columns[columns.index("quantity")] = "stock"
+        missing = {"product_id", "size", "stock"} - set(columns)
+        if missing:
+            raise ValueError(f"{path}: missing column(s) {', '.join(sorted(missing))}")
+        index = {name: position for position, name in enumerate(columns)}
+        last_id, name, price = None, "", 0.0
+        for record in reader:
+            if not record:
+                continue
+            product_id = record[index["product_id"]]
+            if product_id != last_id:
+                last_id, name, price = product_id, "", 0.0
+            if "name" in index and record[index["name"]]:
+                name = record[index["name"]]
+            if "price" in index and record[index["price"]]:
+                price = float(record[index["price"]])
+            yield StockRow(product_id, record[index["size"]], int(record[index["stock"]] or 0), price, name)
+
+
+def _write_rows(f, rows: Iterable[StockRow]) -> int:
+    writer = csv.writer(f, lineterminator="\n")
+    writer.writerow(SNAPSHOT_HEADER)
+    count = 0
+    last_id = None
+    for row in rows:
+        first = row.product_id != last_id
+        last_id = row.product_id
+        writer.writerow([
+            row.product_id,
+            row.size,
+            row.stock,
+            _money(row.price) if first else "",
+            row.name if first else "",
+        ])
+        count += 1
+    return count
+
+
+def sorted_rows(rows: Iterable[StockRow], chunk_rows: int = SORT_CHUNK_ROWS) -> Iterator[StockRow]:
+    """Sort by (product, size) holding at most ``chunk_rows`` rows; larger inputs spill to temp files"""
+    runs = []
+    chunk: list[StockRow] = []
+    try:
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                runs.append(_spill(chunk))
+                chunk = []
+        chunk.sort(key=sort_key)
+        if not runs:
+            yield from chunk
+            return
+        runs.append(_spill(chunk))
+        yield from heapq.merge(*(_read_run(run) for run in runs), key=sort_key)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def _spill(chunk: list[StockRow]):
+    chunk.sort(key=sort_key)
+    run = tempfile.TemporaryFile("w+", newline="")
+    writer = csv.writer(run, lineterminator="\n")
+    writer.writerows(chunk)
+    run.seek(0)
+    return run
+
+
+def _read_run(run) -> Iterator[StockRow]:
+    for product_id, size, stock, price, name in csv.reader(run):
+        yield StockRow(product_id, size, int(stock), float(price), name)
+
+
+def merge_join(left: Iterable[StockRow], right: Iterable[StockRow]) -> Iterator[tuple[Optional[StockRow], Optional[StockRow]]]:
+    """Pair up two sorted streams by (product, size); the missing side is None"""
+    left, right = iter(left), iter(right)
+    a, b = next(left, None), next(right, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and sort_key(a) < sort_key(b)):
+            yield a, None
+            a = next(left, None)
+        elif a is None or sort_key(b) < sort_key(a):
+            yield None, b
+            b = next(right, None)
+        else:
+            yield a, b
+            a, b = next(left, None), next(right, None)
+
+
+def write_snapshot(rows: Iterable[StockRow], path: Path) -> int:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", newline="") as f:
+        count = _write_rows(f, sorted_rows(rows))
+    tmp.replace(path)
+    return count
+
+
+def previous_snapshot(directory: Path, current: Path) -> Optional[Path]:
+    candidates = sorted(p for p in directory.glob("inventory-????-??-??.csv") if p.name < current.name)
+    return candidates[-1] if candidates else None
+
+
+# --- Commands -----------------------------------------------------------------
+
+def cmd_report(args) -> int:
+    print("📊 Fetching inventory from Stripe...\n")
+    total_stock = low = out = products = 0
+    value = 0.0
+    json_file = None
+    if args.json:
+        filename = f"inventory-{datetime.now(timezone.utc).date().isoformat()}.json"
+        json_file = open(filename, "w")
+        json_file.write('{\n  "products": [')
+    else:
+        print("═══════════════════════════════════════════════════════════")
+        print("                   INVENTORY SNAPSHOT                      ")
+        print("═══════════════════════════════════════════════════════════\n")
+
+    for product in iter_products():
+        if not product["sizes"]:
+            print(f"⚠️  Product \"{product['title']}\" has no sizes defined, skipping...")
+            continue
+        rows = sorted(product_rows(product), key=sort_key)
+        product_total = sum(row.stock for row in rows)
+        products += 1
+        total_stock += product_total
+        out += sum(1 for row in rows if row.stock == 0)
+        low += sum(1 for row in rows if 0 < row.stock <= LOW_STOCK)
+        value += product["price"] * product_total
+
+        if json_file:
+            entry = {
+                "id": product["id"],
+                "name": product["title"],
+                "price": product["price"],
+                "sizes": {row.size: row.stock for row in rows},
+                "totalStock": product_total,
+            }
+            json_file.write(("," if products > 1 else "") + "\n    " + json.dumps(entry))
+            continue
+
+        print(f"{products}. 📦 {product['title']}")
+        print(f"   ID: {product['id']}")
+        print(f"   Price: ${product['price']:.2f}")
+        print(f"   Total Stock: {product_total}")
+        for row in rows:
+            status = {"OUT": "❌ OUT ", "LOW": "⚠️  LOW ", "OK": "✅ OK  "}[stock_status(row.stock)]
+            print(f"      {row.size:<6}: {row.stock:>4} {status}")
+        print()
+
+    summary = {
+        "totalProducts": products,
+        "totalStockUnits": total_stock,
+        "lowStockItems": low,
+        "outOfStockItems": out,
+    }
+    if json_file:
+        with json_file:
+            json_file.write("\n  ],\n")
+            json_file.write(f'  "timestamp": {json.dumps(datetime.now(timezone.utc).isoformat())},\n')
+            json_file.write(f'  "summary": {json.dumps(summary)}\n}}\n')
+        print(f"✅ Exported to {json_file.name}")
+        return 0
+
+    print("═══════════════════════════════════════════════════════════")
+    print("📊 SUMMARY")
+    print(f"   Total Products: {products}")
+    print(f"   Total Stock Units: {total_stock}")
+    print(f"   Low Stock Items (≤{LOW_STOCK}): {low}")
+    print(f"   Out of Stock Items: {out}")
+    print(f"   Inventory Value: ${value:.2f}")
+    print("═══════════════════════════════════════════════════════════\n")
+    if out:
+        print(f"⚠️  WARNING: {out} size(s) are OUT OF STOCK!")
+    if low:
+        print(f"⚠️  NOTICE: {low} size(s) have LOW STOCK (≤{LOW_STOCK} units)")
+    print()
+    return 0
+
+
+def print_diff(old: Iterable[StockRow], new: Iterable[StockRow], out: Optional[Path] = None) -> int:
+    """Print (and optionally write) changed stock levels; returns the number of changes"""
+    changes = 0
+    writer = None
+    out_file = open(out, "w", newline="") if out else None
+    try:
+        if out_file:
+            writer = csv.writer(out_file, lineterminator="\n")
+            writer.writerow(["product_id", "size", "before", "after", "change"])
+        for before, after in merge_join(old, new):
+            before_stock = before.stock if before else None
+            after_stock = after.stock if after else None
+            if before_stock == after_stock:
+                continue
+            changes += 1
+            row = after or before
+            delta = (after_stock or 0) - (before_stock or 0)
+            note = " (new)" if before is None else " (removed)" if after is None else ""
+            print(
+                f"   {row.product_id}  {row.size:<5} "
+                f"{'-' if before is None else before_stock:>5} → {'-' if after is None else after_stock:<5} "
+                f"{delta:+d}{note}  {row.name}"
+            )
+            if writer:
+                writer.writerow([
+                    row.product_id, row.size,
+                    "" if before is None else before_stock,
+                    "" if after is None else after_stock,
+                    delta,
+                ])
+    finally:
+        if out_file:
+            out_file.close()
+    print(f"\n{changes} change(s)")
+    return changes
+
+
+def cmd_snapshot(args) -> int:
+    directory = Path(args.dir)
+    path = directory / f"inventory-{datetime.now(timezone.utc).date().isoformat()}.csv"
+    print("📊 Fetching inventory from Stripe...")
+    count = write_snapshot(iter_live_rows(), path)
+    print(f"✅ Exported {count} size(s) to {path}")
+
+    previous = previous_snapshot(directory, path)
+    if previous is None:
+        print("No earlier snapshot to compare against")
+        return 0
+    print(f"\nChanges since {previous.name}:")
+    print_diff(sorted_rows(read_rows(previous)), read_rows(path))
+    return 0
+
+
+def cmd_diff(args) -> int:
+    print_diff(
+        sorted_rows(read_rows(Path(args.old))),
+        sorted_rows(read_rows(Path(args.new))),
+        Path(args.out) if args.out else None,
+    )
+    return 0
+
+
+def cmd_reconcile(args) -> int:
+    """Compare Stripe (or a snapshot) with a ledger of counted stock: product_id,size,stock"""
+    stripe_rows = read_rows(Path(args.snapshot)) if args.snapshot else iter_live_rows(warn=False)
+    pairs = merge_join(sorted_rows(stripe_rows), sorted_rows(read_rows(Path(args.ledger))))
+    mismatched = untracked = unknown = applied = 0
+
+    for product_id, group in groupby(pairs, key=lambda pair: (pair[0] or pair[1]).product_id):
+        updates = {}
+        for stripe_row, ledger_row in group:
+            if ledger_row is None:
+                # Ledgers may cover part of the catalog; only the count is reported
+                untracked += 1
+            elif stripe_row is None:
+                unknown += 1
+                print(f"   {product_id}  {ledger_row.size:<5} in the ledger ({ledger_row.stock}) but not in Stripe")
+            elif stripe_row.stock != ledger_row.stock:
+                mismatched += 1
+                print(
+                    f"   {product_id}  {stripe_row.size:<5} Stripe {stripe_row.stock:>4}, "
+                    f"ledger {ledger_row.stock:>4} ({ledger_row.stock - stripe_row.stock:+d})  {stripe_row.name}"
+                )
+                updates[f"stock_{stripe_row.size}"] = str(ledger_row.stock)
+        if args.apply and updates:
+            # Metadata updates merge, so only the corrected sizes are sent
+            with upstream_call("stripe", "Product.modify"):
+                stripe.Product.modify(product_id, metadata=updates)
+            applied += len(updates)
+
+    print(
+        f"\n{mismatched} mismatch(es), {untracked} size(s) missing from the ledger, "
+        f"{unknown} ledger size(s) unknown to Stripe"
+    )
+    if args.apply:
+        print(f"✅ Set {applied} size(s) in Stripe to the ledger count")
+        return 0
+    return 1 if mismatched else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command")
+
+    report = commands.add_parser("report", help="Print stock levels (or write inventory-DATE.json)")
+    report.add_argument("--json", action="store_true")
+    report.set_defaults(run=cmd_report)
+
+    snapshot = commands.add_parser("snapshot", help="Write inventory-DATE.csv and diff it with the previous one")
+    snapshot.add_argument("--dir", default=".")
+    snapshot.set_defaults(run=cmd_snapshot)
+
+    diff = commands.add_parser("diff", help="Compare two snapshots")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    diff.add_argument("--out", help="Also write the changes as CSV")
+    diff.set_defaults(run=cmd_diff)
+
+    reconcile = commands.add_parser("reconcile", help="Compare Stripe with a ledger CSV of counted stock")
+    reconcile.add_argument("ledger")
+    source = reconcile.add_mutually_exclusive_group()
+    source.add_argument("--snapshot", help="Reconcile this snapshot instead of live Stripe data")
+    source.add_argument("--apply", action="store_true", help="Set Stripe stock to the ledger count where they differ")
+    reconcile.set_defaults(run=cmd_reconcile)
+
+    args = parser.parse_args()
+    if args.command is None:
+        args = parser.parse_args(["report"])
+    if args.command != "diff" and not (args.command == "reconcile" and args.snapshot) and not settings.STRIPE_SECRET_KEY:
+        print("❌ Error: STRIPE_SECRET_KEY is not set", file=sys.stderr)
+        return 1
+    try:
+        return args.run(args)
+    except stripe.error.StripeError as e:
+        print(f"❌ Error fetching inventory: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,405 @@
+"""
+End-to-end load test against fake Stripe/Google/Resend upstreams
+Boots scripts/fake_upstreams.py and the API (uvicorn, or gunicorn with the
+production config via --server gunicorn) with a throwaway
+SQLite database, drives a weighted mix of scenarios at a fixed concurrency,
+and writes throughput and p50/p95/p99 latency per endpoint to a JSON file.
+Pass --compare with an earlier result file to see the change between commits.
+Usage: python scripts/loadtest.py [--duration 30] [--concurrency 50] [--workers 1] [--server uvicorn]
+           [--latency-ms 80] [--jitter-ms 40] [--error-rate 0.01]
+           [--mix browse=60,session=20,login=8,checkout=8,webhook=3,google=1]
+           [--out loadtest-results.json] [--compare previous.json]
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).parent.parent
+DEFAULT_MIX = "browse=60,session=20,login=8,checkout=8,webhook=3,google=1"
+BROWSER_ENCODINGS = "gzip, deflate, br, zstd"
+PASSWORD = "load-test-password"
+
+
+@dataclass
+class State:
+    webhook_secret: str
+    burst: int
+    users: list[dict] = field(default_factory=list)
+    products: list[dict] = field(default_factory=list)
+    sessions: list[str] = field(default_factory=list)
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    statuses: dict[str, Counter] = field(default_factory=lambda: defaultdict(Counter))
+
+
+async def timed(state: State, name: str, request) -> httpx.Response | None:
+    started = time.perf_counter()
+    try:
+        response = await request
+        await response.aread()
+        status = str(response.status_code)
+    except httpx.HTTPError as e:
+        response, status = None, type(e).__name__
+    state.latencies[name].append(time.perf_counter() - started)
+    state.statuses[name][status] += 1
+    return response
+
+
+# Scenarios -------------------------------------------------------------------
+
+async def browse(client: httpx.AsyncClient, state: State) -> None:
+    await timed(state, "GET /api/products", client.get(
+        "/api/products", headers={"accept-encoding": BROWSER_ENCODINGS}
+    ))
+
+
+async def session(client: httpx.AsyncClient, state: State) -> None:
+    user = random.choice(state.users)
+    await timed(state, "GET /api/auth/session", client.get(
+        "/api/auth/session", headers={"authorization": f"Bearer {user['token']}"}
+    ))
+
+
+async def login(client: httpx.AsyncClient, state: State) -> None:
+    user = random.choice(state.users)
+    await timed(state, "POST /api/auth/login", client.post(
+        "/api/auth/login", json={"email": user["email"], "password": PASSWORD}
+    ))
+
+
+async def checkout(client: httpx.AsyncClient, state: State) -> None:
+    items = [
+        {
+            "productId": product["id"],
+            "size": random.choice(product["sizes"]),
+            "quantity": random.randint(1, 2),
+        }
+        for product in random.sample(state.products, k=min(len(state.products), random.randint(1, 3)))
+    ]
+    response = await timed(state, "POST /api/checkout/session", client.post(
+        "/api/checkout/session",
+        json={"items": items, "successUrl": "http://localhost/ok", "cancelUrl": "http://localhost/cancel"},
+        headers={"x-client-session": uuid.uuid4().hex},
+    ))
+    if response is not None and response.status_code == 200:
+        state.sessions.append(response.json()["url"].rsplit("/", 1)[-1])
+
+
+def _signed_event(state: State, session_id: str) -> tuple[bytes, str]:
+    product = random.choice(state.products)
+    event = {
+        "id": f"evt_{uuid.uuid4().hex}",
+        "object": "event",
+        "type": "checkout.session.completed",
+        "data": {"object": {
+            "id": session_id,
+            "object": "checkout.session",
+            "amount_total": 4000,
+            "currency": "usd",
+            "created": int(time.time()),
+            "customer_details": {"email": "buyer@loadtest.example.com"},
+            "metadata": {
+                "item_0_product_id": product["id"],
+                "item_0_size": product["sizes"][0],
+                "item_0_quantity": "1",
+            },
+        }},
+    }
+    payload = json.dumps(event).encode()
+    timestamp = int(time.time())
+    signature = hmac.new(
+        state.webhook_secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256
+    ).hexdigest()
+    return payload, f"t={timestamp},v1={signature}"
+
+
+async def webhook(client: httpx.AsyncClient, state: State) -> None:
+    """A burst of checkout.session.completed deliveries, as after a drop"""
+    async def deliver():
+        session_id = state.sessions.pop() if state.sessions else f"cs_test_gen{uuid.uuid4().hex}"
+        payload, signature = _signed_event(state, session_id)
+        await timed(state, "POST /api/stripe/webhook", client.post(
+            "/api/stripe/webhook",
+            content=payload,
+            headers={"stripe-signature": signature, "content-type": "application/json"},
+        ))
+
+    await asyncio.gather(*(deliver() for _ in range(state.burst)))
+
+
+async def google(client: httpx.AsyncClient, state: State) -> None:
+    await timed(state, "GET /api/auth/google/callback", client.get(
+        "/api/auth/google/callback", params={"code": f"user{random.randint(0, 99)}"}
+    ))
+
+
+SCENARIOS = {
+    "browse": browse,
+    "session": session,
+    "login": login,
+    "checkout": checkout,
+    "webhook": webhook,
+    "google": google,
+}
+
+
+# Stack -----------------------------------------------------------------------
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_stack(args, workdir: Path) -> tuple[list[subprocess.Popen], str, str]:
+    fake_port, api_port = free_port(), free_port()
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    webhook_secret = f"whsec_{secrets.token_hex(16)}"
+    fake = subprocess.Popen([
+        sys.executable, str(BACKEND_DIR / "scripts" / "fake_upstreams.py"),
+        "--port", str(fake_port),
+        "--latency-ms", str(args.latency_ms),
+        "--jitter-ms", str(args.jitter_ms),
+        "--error-rate", str(args.error_rate),
+        "--products", str(args.products),
+    ])
+    env = {
+        **os.environ,
+        "DATABASE_URL": args.database_url or f"sqlite:///{workdir / 'loadtest.db'}",
+        "SECRET_KEY": secrets.token_hex(32),
+        "CACHE_URL": "memory://",
+        "CATALOG_SNAPSHOT_PATH": str(workdir / "catalog.snapshot"),
+        "STRIPE_SECRET_KEY": "sk_test_loadtest",
+        "STRIPE_WEBHOOK_SECRET": webhook_secret,
+        "STRIPE_API_BASE": fake_url,
+        "GOOGLE_CLIENT_ID": "loadtest",
+        "GOOGLE_CLIENT_SECRET": "loadtest",
+        "GOOGLE_TOKEN_URL": f"{fake_url}/google/token",
+        "GOOGLE_USERINFO_URL": f"{fake_url}/google/userinfo",
+        "RESEND_API_KEY": "re_loadtest",
+        "RESEND_API_URL": fake_url,
+        # Every simulated client shares 127.0.0.1; measure the app, not the limiter
+        "RATE_LIMIT_ENABLED": "false",
+    }
+    if args.server == "gunicorn":
+        # gunicorn.conf.py (preload, uvloop/httptools workers) is picked up from BACKEND_DIR
+        command = [
+            sys.executable, "-m", "gunicorn", "app.main:app",
+            "--bind", f"127.0.0.1:{api_port}",
+            "--workers", str(args.workers), "--log-level", "warning", "--access-logfile", "/dev/null",
+        ]
+    else:
+        command = [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(api_port),
+            "--workers", str(args.workers), "--log-level", "warning",
+        ]
+    api = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    return [api, fake], f"http://127.0.0.1:{api_port}", webhook_secret
+
+
+async def wait_ready(base_url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/api/health/ready")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"API at {base_url} did not become ready within {timeout:.0f}s")
+
+
+async def prepare(client: httpx.AsyncClient, state: State, users: int) -> None:
+    response = await client.get("/api/products", headers={"accept-encoding": "gzip"})
+    response.raise_for_status()
+    state.products = [p for p in response.json()["products"] if p.get("sizes")]
+    if not state.products:
+        raise RuntimeError("The catalog has no products with sizes")
+
+    run_id = uuid.uuid4().hex[:8]
+
+    async def register(n: int) -> None:
+        email = f"load{run_id}-{n}@loadtest.example.com"
+        response = await client.post(
+            "/api/auth/register", json={"email": email, "password": PASSWORD, "name": f"Load {n}"}
+        )
+        response.raise_for_status()
+        state.users.append({"email": email, "token": response.json()["access_token"]})
+
+    await asyncio.gather(*(register(n) for n in range(users)))
+
+
+# Run & report ----------------------------------------------------------------
+
+def parse_mix(spec: str) -> dict[str, int]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name.strip()] = int(weight)
+    return mix
+
+
+async def drive(client: httpx.AsyncClient, state: State, mix: dict[str, int], concurrency: int, duration: float):
+    names, weights = list(mix), list(mix.values())
+    deadline = time.monotonic() + duration
+
+    async def worker():
+        while time.monotonic() < deadline:
+            scenario = random.choices(names, weights)[0]
+            await SCENARIOS[scenario](client, state)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, round(p / 100 * (len(sorted_values) - 1)))]
+
+
+def summarize(latencies: list[float], statuses: Counter, elapsed: float) -> dict:
+    values = sorted(latencies)
+    errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 500)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rps": round(len(values) / elapsed, 2),
+        "p50_ms": round(percentile(values, 50) * 1e3, 2),
+        "p95_ms": round(percentile(values, 95) * 1e3, 2),
+        "p99_ms": round(percentile(values, 99) * 1e3, 2),
+        "max_ms": round((values[-1] if values else 0.0) * 1e3, 2),
+        "statuses": dict(sorted(statuses.items())),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: dict) -> None:
+    print(f"\n{'endpoint':<34} {'reqs':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    rows = list(report["endpoints"].items()) + [("total", report["total"])]
+    for name, row in rows:
+        print(
+            f"{name:<34} {row['requests']:>7} {row['errors']:>5} {row['rps']:>8.1f} "
+            f"{row['p50_ms']:>6.1f}ms {row['p95_ms']:>6.1f}ms {row['p99_ms']:>6.1f}ms"
+        )
+
+
+def print_comparison(previous: dict, current: dict) -> None:
+    def delta(old: float, new: float) -> str:
+        return f"{(new - old) / old:+.0%}" if old else "n/a"
+
+    print(f"\n📊 Compared with {previous['meta'].get('git_commit') or 'previous run'}\n")
+    print(f"{'endpoint':<34} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    rows = list(current["endpoints"].items()) + [("total", current["total"])]
+    for name, row in rows:
+        old = previous["total"] if name == "total" else previous["endpoints"].get(name)
+        if not old:
+            continue
+        print(
+            f"{name:<34} {delta(old['rps'], row['rps']):>8} {delta(old['p50_ms'], row['p50_ms']):>8} "
+            f"{delta(old['p95_ms'], row['p95_ms']):>8} {delta(old['p99_ms'], row['p99_ms']):>8}"
+        )
+
+
+async def run(args) -> dict:
+    mix = parse_mix(args.mix)
+    with tempfile.TemporaryDirectory(prefix="balm-loadtest-") as workdir:
+        processes, base_url, webhook_secret = start_stack(args, Path(workdir))
+        try:
+            await wait_ready(base_url)
+            state = State(webhook_secret=webhook_secret, burst=args.burst)
+            limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+            async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+                await prepare(client, state, args.users)
+                print(f"\n🚦 {args.concurrency} concurrent clients for {args.duration:.0f}s against {base_url} "
+                      f"({args.workers} {args.server} worker(s), upstream latency {args.latency_ms:.0f}±{args.jitter_ms:.0f}ms, "
+                      f"{args.error_rate:.1%} errors)")
+                started = time.monotonic()
+                await drive(client, state, mix, args.concurrency, args.duration)
+                elapsed = time.monotonic() - started
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=30)
+
+    all_latencies = [v for values in state.latencies.values() for v in values]
+    all_statuses = sum(state.statuses.values(), Counter())
+    return {
+        "meta": {
+            "git_commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "duration_s": round(elapsed, 2),
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "server": args.server,
+            "mix": mix,
+            "webhook_burst": args.burst,
+            "upstream_latency_ms": args.latency_ms,
+            "upstream_jitter_ms": args.jitter_ms,
+            "upstream_error_rate": args.error_rate,
+        },
+        "endpoints": {
+            name: summarize(state.latencies[name], state.statuses[name], elapsed)
+            for name in sorted(state.latencies)
+        },
+        "total": summarize(all_latencies, all_statuses, elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=1, help="API worker processes")
+    parser.add_argument("--server", choices=("uvicorn", "gunicorn"), default="uvicorn")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario=weight,...")
+    parser.add_argument("--burst", type=int, default=10, help="webhook deliveries per webhook scenario")
+    parser.add_argument("--users", type=int, default=20, help="accounts registered before the run")
+    parser.add_argument("--products", type=int, default=40, help="products in the fake Stripe catalog")
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="fake upstream latency")
+    parser.add_argument("--jitter-ms", type=float, default=40.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls that fail")
+    parser.add_argument("--database-url", help="defaults to a throwaway SQLite file")
+    parser.add_argument("--out", type=Path, default=Path("loadtest-results.json"))
+    parser.add_argument("--compare", type=Path, help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    args.out.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"\n💾 Results written to {args.out}")
+    if args.compare:
+        print_comparison(json.loads(args.compare.read_text()), report)
+    print()
+
+
+if __name__ == "__main__":
+    main()
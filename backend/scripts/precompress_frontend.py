@@ -0,0 +1,33 @@
+"""
+Write the .br/.gz variants for the built frontend
+Run after `npm run build`; the gunicorn master also does this before forking,
+which is then only a stat() per file.
+Usage: python scripts/precompress_frontend.py [--dist ../frontend/dist]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.static_assets import precompress
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dist", type=Path, default=Path(__file__).parent.parent.parent / "frontend" / "dist")
+    args = parser.parse_args()
+
+    if not (args.dist / "index.html").exists():
+        sys.exit(f"❌ No build at {args.dist}; run `npm run build` in frontend/ first")
+
+    started = time.perf_counter()
+    stats = precompress(args.dist)
+    print(f"🗜️  Precompressed in {time.perf_counter() - started:.2f}s "
+          f"({stats['written']} written, {stats['up_to_date']} up to date)")
+
+
+if __name__ == "__main__":
+    main()
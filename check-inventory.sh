@@ -2,6 +2,7 @@
 
 # Helper script to check inventory
 # Usage: ./check-inventory.sh [--csv|--json]
+#        ./check-inventory.sh snapshot|diff|reconcile ...  (see backend/scripts/inventory.py)
 
 # Try to load from .env file if STRIPE_SECRET_KEY is not already set
 if [ -z "$STRIPE_SECRET_KEY" ] && [ -f .env ]; then
@@ -21,6 +22,18 @@ if [ -z "$STRIPE_SECRET_KEY" ]; then
   exit 1
 fi
 
-# Use stripe from netlify/functions/node_modules
-NODE_PATH=./netlify/functions/node_modules node scripts/verify-inventory.js "$@"
+# Use the backend virtualenv when there is one
+PYTHON=python3
+if [ -x backend/venv/bin/python ]; then
+  PYTHON=backend/venv/bin/python
+fi
+
+# --csv and --json are the flags of the old Node script
+case "$1" in
+  --csv) set -- snapshot ;;
+  --json) set -- report --json ;;
+  "") set -- report ;;
+esac
+
+"$PYTHON" backend/scripts/inventory.py "$@"
 
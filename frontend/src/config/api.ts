@@ -15,3 +15,15 @@ export const API_ENDPOINTS = {
   // Checkout
   createCheckoutSession: `${API_BASE_URL}/api/checkout/session`,
 } as const;
+
+// Per-tab ID sent with checkout requests so the backend can collapse
+// double-submits of the same cart without merging different shoppers.
+export const getClientSessionId = (): string => {
+  const key = "balm-client-session";
+  let id = sessionStorage.getItem(key);
+  if (!id) {
+    id = crypto.randomUUID();
+    sessionStorage.setItem(key, id);
+  }
+  return id;
+};
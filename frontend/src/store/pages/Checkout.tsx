@@ -9,7 +9,7 @@ import { PrivacyPolicyContent } from "../../components/PrivacyPolicyContent";
 import { TermsOfServiceContent } from "../../components/TermsOfServiceContent";
 import StoreHeader from "../components/StoreHeader";
 import { StoreFooter } from "../components/StoreFooter";
-import { API_ENDPOINTS } from "../../config/api";
+import { API_ENDPOINTS, getClientSessionId } from "../../config/api";
 
 const Checkout = () => {
   const navigate = useNavigate();
@@ -50,9 +50,11 @@ const Checkout = () => {
     try {
       // Prepare line items for Stripe. Always include size + stripeProductId
       // when present so the backend can record them in checkout-session
-      // metadata for inventory decrements via the webhook.
+      // metadata for inventory decrements via the webhook. Prices are
+      // resolved server-side from the catalog; price_data is only a hint.
       const lineItems = items.map((item) => {
         const meta = {
+          productId: item.id,
           ...(item.size ? { size: item.size } : {}),
           ...((item as any).stripeProductId
             ? { stripeProductId: (item as any).stripeProductId }
@@ -108,6 +110,7 @@ const Checkout = () => {
           method: "POST",
           headers: {
             "Content-Type": "application/json",
+            "X-Client-Session": getClientSessionId(),
           },
           body: JSON.stringify({
             items: lineItems,
@@ -139,7 +142,11 @@ const Checkout = () => {
 
       if (!response.ok) {
         throw new Error(
-          data?.error || data?.message || `Server error (${response.status})`
+          data?.error ||
+            data?.message ||
+            data?.detail?.message ||
+            (typeof data?.detail === "string" ? data.detail : null) ||
+            `Server error (${response.status})`
         );
       }
 